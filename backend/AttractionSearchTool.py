@@ -1,23 +1,54 @@
 import os
-import requests
-from dotenv import load_dotenv
-from smolagents import tool
-from collector import collected_results
+import airports
+import http_client
+import config
+import collector
+import telemetry
+from records import Attraction
+from cache import geocode_cache, result_cache, normalize_key
 
-# Load the Google Places API key from .env
-load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-def get_coordinates(city_name):
-    """Get latitude and longitude of a city name using Google Geocoding API."""
-    geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": city_name, "key": GOOGLE_API_KEY}
-    res = requests.get(geocode_url, params=params).json()
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+NEARBY_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+def parse_geocode(res: dict):
     if res["status"] != "OK":
         return None
     location = res["results"][0]["geometry"]["location"]
     return location["lat"], location["lng"]
 
+def city_key(location: str) -> str:
+    """Cache key shared by every spelling of a known city, so warmed entries serve "NYC" and "New York" alike."""
+    return normalize_key(airports.canonical_city(location))
+
+def get_coordinates(city_name):
+    """Get latitude and longitude of a city name using Google Geocoding API."""
+    key = city_key(city_name)
+    coords = geocode_cache.get(key)
+    if coords is not None:
+        return tuple(coords)
+
+    params = {"address": city_name, "key": GOOGLE_API_KEY}
+    coords = parse_geocode(http_client.get(GEOCODE_URL, params=params).json())
+    if coords:
+        geocode_cache.set(key, list(coords))
+    return coords
+
+async def aget_coordinates(city_name):
+    """Async variant of `get_coordinates`, sharing its cache."""
+    key = city_key(city_name)
+    coords = geocode_cache.get(key)
+    if coords is not None:
+        return tuple(coords)
+
+    params = {"address": city_name, "key": GOOGLE_API_KEY}
+    res = await http_client.aget(GEOCODE_URL, params=params)
+    coords = parse_geocode(res.json())
+    if coords:
+        geocode_cache.set(key, list(coords))
+    return coords
+
 def fetch_popular_attractions(location: str, radius=5000, max_results=10):
     """Use Google Places API to fetch nearby tourist attractions."""
     coords = get_coordinates(location)
@@ -33,7 +64,7 @@ def fetch_popular_attractions(location: str, radius=5000, max_results=10):
         "key": GOOGLE_API_KEY
     }
 
-    res = requests.get(url, params=params).json()
+    res = http_client.get(url, params=params).json()
     if res["status"] != "OK":
         return [{"error": f"API Error: {res['status']}"}]
 
@@ -53,7 +84,7 @@ def fetch_popular_attractions(location: str, radius=5000, max_results=10):
 
     return results
 
-@tool
+@telemetry.traced("tool.attractions")
 def get_popular_attractions(location: str) -> list:
     """
     Gets top-rated popular attractions in a city.
@@ -65,20 +96,23 @@ def get_popular_attractions(location: str) -> list:
         A list of attractions (max 5), each with name, rating, user ratings, and category,
         including latitude and longitude.
     """
-    coords = get_coordinates(location)
-    if not coords:
-        return [{"error": "Could not determine coordinates."}]
-
-    lat, lng = coords
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
+    attractions = result_cache.get_or_compute(
+        "attractions",
+        city_key(location),
+        lambda: query_attractions(location),
+    )
+    collector.record("attractions", attractions)
+    return attractions
+
+def nearby_params(lat: float, lng: float) -> dict:
+    return {
         "location": f"{lat},{lng}",
         "radius": 5000,
         "type": "tourist_attraction",
         "key": GOOGLE_API_KEY
     }
 
-    res = requests.get(url, params=params).json()
+def parse_attractions(res: dict) -> list:
     if res["status"] != "OK":
         return [{"error": f"API Error: {res['status']}"}]
 
@@ -95,18 +129,43 @@ def get_popular_attractions(location: str) -> list:
                 image_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_API_KEY}"
             else:
                 image_url = None
-            filtered.append({
-                "name": a.get("name"),
-                "lat": loc["lat"],             # ✅ added
-                "lng": loc["lng"],             # ✅ added
-                "rating": rating,
-                "reviews": reviews,
-                "category": ", ".join(a.get("types", [])[:2]),
-                "image": image_url,
-                "maps_url": f"https://www.google.com/maps/place/?q=place_id:{a['place_id']}"
-
-            })
-
-    collected_results["attractions"] = filtered[:6]
+            filtered.append(Attraction(
+                name=a.get("name"),
+                lat=loc["lat"],             # ✅ added
+                lng=loc["lng"],             # ✅ added
+                rating=rating,
+                reviews=reviews,
+                category=", ".join(a.get("types", [])[:2]),
+                image=image_url,
+                maps_url=f"https://www.google.com/maps/place/?q=place_id:{a['place_id']}",
+                address=a.get("vicinity")
+            ))
+
     return filtered[:6]
 
+def query_attractions(location: str) -> list:
+    coords = get_coordinates(location)
+    if not coords:
+        return [{"error": "Could not determine coordinates."}]
+
+    res = http_client.get(NEARBY_URL, params=nearby_params(*coords)).json()
+    return parse_attractions(res)
+
+async def aquery_attractions(location: str) -> list:
+    coords = await aget_coordinates(location)
+    if not coords:
+        return [{"error": "Could not determine coordinates."}]
+
+    res = await http_client.aget(NEARBY_URL, params=nearby_params(*coords))
+    return parse_attractions(res.json())
+
+@telemetry.traced("tool.attractions")
+async def async_get_popular_attractions(location: str) -> list:
+    """Async variant of `get_popular_attractions`."""
+    attractions = await result_cache.aget_or_compute(
+        "attractions",
+        city_key(location),
+        lambda: aquery_attractions(location),
+    )
+    collector.record("attractions", attractions)
+    return attractions
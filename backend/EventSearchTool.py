@@ -1,13 +1,20 @@
-from datetime import timedelta
+import asyncio
+from datetime import datetime, timedelta
 import os
-import requests
-from dotenv import load_dotenv
-from smolagents import tool
-from collector import collected_results
+import http_client
+import config
+import collector
+import telemetry
+from records import Event
+from cache import result_cache, normalize_key
 
-load_dotenv()
 TICKETMASTER_API_KEY = os.getenv("TICKETMASTER_API_KEY")
 
+# Multi-day searches page through one date-range query instead of one query per day
+EVENT_PAGE_SIZE = 50
+EVENT_MAX_PAGES = int(os.getenv("EVENT_MAX_PAGES", "4"))
+EVENTS_PER_DAY = 3
+
 def fetch_ticketmaster_events(location: str, keyword: str = "", size: int = 5) -> str:
     url = "https://app.ticketmaster.com/discovery/v2/events.json"
     params = {
@@ -18,7 +25,7 @@ def fetch_ticketmaster_events(location: str, keyword: str = "", size: int = 5) -
         "sort": "date,asc"
     }
 
-    response = requests.get(url, params=params)
+    response = http_client.get(url, params=params)
     if response.status_code != 200:
         return f"Error: {response.status_code} - {response.text}"
 
@@ -39,31 +46,44 @@ def fetch_ticketmaster_events(location: str, keyword: str = "", size: int = 5) -
 
     return "\n".join(results)
 
-@tool
-def search_ticketmaster_events(location: str, date: str, keyword: str = "") -> list:
+@telemetry.traced("tool.events")
+def search_ticketmaster_events(location: str, date: str, keyword: str = "", days: int = 1) -> list:
     """
-    Search Ticketmaster for events in a city on a specific date.
+    Search Ticketmaster for events in a city on a specific date, or over several days.
 
     Args:
         location: City name (e.g., "Boston")
-        date: Date string in YYYY-MM-DD format
+        date: Date string in YYYY-MM-DD format (the first day of the trip)
         keyword: Optional keyword (e.g., "music")
+        days: Number of days to cover from `date`; all of them are searched in one query
 
     Returns:
         List of events: name, date, venue, and url
     """
-    from datetime import datetime
+    if days > 1:
+        compute = lambda: query_event_range(location, date, days, keyword)
+    else:
+        compute = lambda: query_events(location, date, keyword)
+    events = result_cache.get_or_compute("events", normalize_key(location, date, keyword, days), compute)
+    collector.record("events", events)
+    return events
+
+EVENTS_URL = "https://app.ticketmaster.com/discovery/v2/events.json"
 
+def event_params(location: str, date: str, keyword: str = "", days: int = 0, page: int = 0):
+    """
+    Discovery API params for one day in a city, or None if the date is malformed.
+    With `days`, one page of every event in the `days` starting at `date`.
+    """
     # Convert "YYYY-MM-DD" to ISO8601 datetime string (start of that day)
     try:
         parsed_date = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
-        return [{"error": "Invalid date format. Use YYYY-MM-DD"}]
+        return None
 
     start_dt = parsed_date.strftime("%Y-%m-%dT00:00:00-05:00")
     end_dt = (parsed_date + timedelta(days=1)).strftime("%Y-%m-%dT00:00:00-05:00")
 
-    url = "https://app.ticketmaster.com/discovery/v2/events.json"
     params = {
         "apikey": TICKETMASTER_API_KEY,
         "keyword": keyword,
@@ -72,12 +92,18 @@ def search_ticketmaster_events(location: str, date: str, keyword: str = "") -> l
         "startDateTime": start_dt,
         "sort": "date,asc"
     }
+    if days:
+        end_dt = (parsed_date + timedelta(days=days)).strftime("%Y-%m-%dT00:00:00-05:00")
+        params.update(endDateTime=end_dt, size=EVENT_PAGE_SIZE, page=page)
+    return params
 
-    response = requests.get(url, params=params)
+def parse_events(response) -> list:
     if response.status_code != 200:
         return [{"error": f"Ticketmaster API Error {response.status_code}"}]
+    return event_records(response.json())[:6]
 
-    events = response.json().get("_embedded", {}).get("events", [])
+def event_records(data: dict) -> list:
+    events = data.get("_embedded", {}).get("events", [])
     results = []
 
     for event in events:
@@ -85,16 +111,118 @@ def search_ticketmaster_events(location: str, date: str, keyword: str = "") -> l
         date_info = event.get("dates", {}).get("start", {})
         date_str = date_info.get("localDate", "No Date")
         time_str = date_info.get("localTime", "")
-        venue = event.get("_embedded", {}).get("venues", [{}])[0].get("name", "Unknown Venue")
+        venue = event.get("_embedded", {}).get("venues", [{}])[0]
+        location = venue.get("location", {})
         url = event.get("url", "#")
 
-        results.append({
-            "name": name,
-            "date": f"{date_str} {time_str}".strip(),
-            "venue": venue,
-            "url": url,
-            "image": event.get("images", [{}])[0].get("url", "")
-        })
-    collected_results["events"] = results[:6]
-    return results[:6]
+        results.append(Event(
+            name=name,
+            date=f"{date_str} {time_str}".strip(),
+            venue=venue.get("name", "Unknown Venue"),
+            url=url,
+            image=event.get("images", [{}])[0].get("url", ""),
+            lat=location.get("latitude"),
+            lng=location.get("longitude"),
+        ))
+    return results
+
+def parse_event_page(response):
+    """(events, total pages) from one page of a date-range search, or None if it failed."""
+    if response.status_code != 200:
+        print("❌ Ticketmaster page fetch failed", response.status_code)
+        return None
+    data = response.json()
+    return event_records(data), data.get("page", {}).get("totalPages", 1)
+
+def per_day(events: list, limit: int = EVENTS_PER_DAY) -> list:
+    """The first `limit` events of each day, keeping date order."""
+    counts = {}
+    kept = []
+    for event in events:
+        day = event.date[:10]
+        if counts.get(day, 0) < limit:
+            counts[day] = counts.get(day, 0) + 1
+            kept.append(event)
+    return kept
+
+def merge_event_pages(pages: list) -> list:
+    """Events of every fetched page, once each, capped per day; failed pages are skipped."""
+    seen = set()
+    events = []
+    for page in pages:
+        if page is None:
+            continue
+        for event in page[0]:
+            key = (event.name, event.date, event.venue)
+            if key not in seen:
+                seen.add(key)
+                events.append(event)
+    return per_day(events)
+
+def query_event_range(location: str, date: str, days: int, keyword: str = "") -> list:
+    """Events over `days` days from one paginated query, at most `EVENTS_PER_DAY` a day."""
+    params = event_params(location, date, keyword, days)
+    if params is None:
+        return [{"error": "Invalid date format. Use YYYY-MM-DD"}]
+
+    first = parse_event_page(http_client.get(EVENTS_URL, params=params))
+    if first is None:
+        return [{"error": "Ticketmaster API Error"}]
+
+    def fetch(page):
+        try:
+            return parse_event_page(http_client.get(EVENTS_URL, params=event_params(location, date, keyword, days, page)))
+        except Exception as e:
+            # e.g. no rate-limit token in time: keep the pages we already have
+            print(f"❌ Ticketmaster page {page} failed:", str(e))
+            return None
+
+    pages = [first] + [fetch(page) for page in range(1, min(first[1], EVENT_MAX_PAGES))]
+    return merge_event_pages(pages)
+
+async def aquery_event_range(location: str, date: str, days: int, keyword: str = "") -> list:
+    """Async variant of `query_event_range`; pages after the first are fetched together."""
+    params = event_params(location, date, keyword, days)
+    if params is None:
+        return [{"error": "Invalid date format. Use YYYY-MM-DD"}]
+
+    first = parse_event_page(await http_client.aget(EVENTS_URL, params=params))
+    if first is None:
+        return [{"error": "Ticketmaster API Error"}]
+
+    async def fetch(page):
+        try:
+            return parse_event_page(await http_client.aget(EVENTS_URL, params=event_params(location, date, keyword, days, page)))
+        except Exception as e:
+            print(f"❌ Ticketmaster page {page} failed:", str(e))
+            return None
+
+    rest = await asyncio.gather(*(fetch(page) for page in range(1, min(first[1], EVENT_MAX_PAGES))))
+    return merge_event_pages([first, *rest])
+
+def query_events(location: str, date: str, keyword: str = "") -> list:
+    params = event_params(location, date, keyword)
+    if params is None:
+        return [{"error": "Invalid date format. Use YYYY-MM-DD"}]
+
+    response = http_client.get(EVENTS_URL, params=params)
+    return parse_events(response)
+
+async def aquery_events(location: str, date: str, keyword: str = "") -> list:
+    params = event_params(location, date, keyword)
+    if params is None:
+        return [{"error": "Invalid date format. Use YYYY-MM-DD"}]
 
+    response = await http_client.aget(EVENTS_URL, params=params)
+    return parse_events(response)
+
+@telemetry.traced("tool.events")
+async def async_search_ticketmaster_events(location: str, date: str, keyword: str = "", days: int = 1) -> list:
+    """Async variant of `search_ticketmaster_events`."""
+    if days > 1:
+        compute = lambda: aquery_event_range(location, date, days, keyword)
+    else:
+        compute = lambda: aquery_events(location, date, keyword)
+    events = await result_cache.aget_or_compute("events", normalize_key(location, date, keyword, days), compute)
+    collector.record("events", events)
+    return events
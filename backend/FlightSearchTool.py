@@ -1,110 +1,277 @@
+import asyncio
 import os
-import requests
-from dotenv import load_dotenv
-from smolagents import tool
-from collector import collected_results
-
-load_dotenv()
-AMADEUS_CLIENT_ID = os.getenv("AMADEUS_API_KEY")
-AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_SECRET")
-
-def get_amadeus_token():
-    url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": AMADEUS_CLIENT_ID,
-        "client_secret": AMADEUS_CLIENT_SECRET
-    }
-    response = requests.post(url, data=data)
-    response.raise_for_status()
-    return response.json()["access_token"]
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as date_cls, timedelta
+import http_client
+import config
+import airports
+import collector
+import telemetry
+from records import Flight
+from cache import result_cache, normalize_key
+from amadeus_auth import get_amadeus_token, aget_amadeus_token, token_manager
+
+# Flexible searches fan out into many Amadeus queries; these bound each search
+# and, through the shared pool, how many run at once across all requests
+FLEX_MAX_QUERIES = int(os.getenv("FLIGHT_FLEX_MAX_QUERIES", "20"))
+FLEX_CONCURRENCY = int(os.getenv("FLIGHT_FLEX_CONCURRENCY", "4"))
+flex_pool = ThreadPoolExecutor(max_workers=FLEX_CONCURRENCY)
+_flex_semaphores = weakref.WeakKeyDictionary()
 
-@tool
+@telemetry.traced("tool.flights")
 def search_flight_amadeus(origin: str, destination: str, date: str) -> list:
     """
     Search for top 3 flights using Amadeus API.
 
     Args:
-        origin: IATA code of departure (e.g., "JFK")
-        destination: IATA code of arrival (e.g., "LAX")
+        origin: IATA airport or city code of departure (e.g., "JFK" or "NYC"); city names are resolved too
+        destination: IATA airport or city code of arrival (e.g., "LAX")
         date: Departure date (YYYY-MM-DD)
 
     Returns:
-        A list of flights with airline, departure/arrival time, price.
+        A list of Flight records with airline, from, to, departure_time, arrival_time and price.
     """
-    IATA_AIRLINES = {
-        "AA": "American Airlines",
-        "DL": "Delta Air Lines",
-        "UA": "United Airlines",
-        "B6": "JetBlue",
-        "F9": "Frontier Airlines",
-        "WN": "Southwest Airlines",
-        "NK": "Spirit Airlines",
-        "SY": "Sun Country Airlines",
-        "AS": "Alaska Airlines",
-        "HA": "Hawaiian Airlines",
-        "9K": "Cape Air"
+    origin, destination, error = normalize_route(origin, destination)
+    if error:
+        collector.record("flights", error)
+        return error
+    flights = result_cache.get_or_compute(
+        "flights",
+        normalize_key(origin, destination, date),
+        lambda: query_flights(origin, destination, date),
+    )
+    collector.record("flights", flights)
+    return flights
+
+IATA_AIRLINES = {
+    "AA": "American Airlines",
+    "DL": "Delta Air Lines",
+    "UA": "United Airlines",
+    "B6": "JetBlue",
+    "F9": "Frontier Airlines",
+    "WN": "Southwest Airlines",
+    "NK": "Spirit Airlines",
+    "SY": "Sun Country Airlines",
+    "AS": "Alaska Airlines",
+    "HA": "Hawaiian Airlines",
+    "9K": "Cape Air"
+}
+
+FLIGHT_OFFERS_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+
+def normalize_route(origin: str, destination: str):
+    """Map city names, aliases and codes to Amadeus location codes before any network call."""
+    codes = airports.location_code(origin), airports.location_code(destination)
+    for query, code in zip((origin, destination), codes):
+        if code is None:
+            print(f"🚫 Unknown airport or city: {query!r}")
+            return None, None, [{"error": f"Unknown airport or city: {query}"}]
+    return codes[0], codes[1], None
+
+def flight_params(origin: str, destination: str, date: str) -> dict:
+    return {
+        "originLocationCode": origin,
+        "destinationLocationCode": destination,
+        "departureDate": date,
+        "adults": 1,
+        "currencyCode": "USD",
+        "max": 20
     }
 
+def parse_flight_offers(res, origin: str, destination: str) -> list:
+    """Turn a flight-offers response (requests or httpx) into the cheapest direct-match flights."""
+    if res.status_code == 401:
+        token_manager.invalidate()
+
+    if res.status_code != 200:
+        print(f"🚨 Amadeus API Error {res.status_code}: {res.text}")
+        return [{"error": f"Amadeus API Error {res.status_code}"}]
+
+    data = res.json()
+    offers = data.get("data", [])
+    flights = []
+    origin_airports, destination_airports = airports.airport_codes(origin), airports.airport_codes(destination)
+
+    for offer in offers:
+        segments = offer["itineraries"][0]["segments"]
+        if not segments:
+            continue
+
+        first_seg = segments[0]
+        last_seg = segments[-1]
+
+        # City codes (e.g. NYC) match any of their airports
+        if first_seg["departure"]["iataCode"] not in origin_airports or last_seg["arrival"]["iataCode"] not in destination_airports:
+            continue
+
+        carrier = first_seg.get("carrierCode", "Unknown")
+        price = offer["price"]["total"]
+
+        flights.append(Flight(
+            airline=IATA_AIRLINES.get(carrier, carrier),
+            origin=first_seg["departure"]["iataCode"],
+            destination=last_seg["arrival"]["iataCode"],
+            departure_time=first_seg["departure"]["at"],
+            arrival_time=last_seg["arrival"]["at"],
+            price=price
+        ))
+
+    flights = sorted(flights, key=lambda f: f.price)
+
+    print("✅ Flights collected:")
+    for f in flights[:6]:
+        print("  -", f)
+
+    return flights[:6]
+
+def query_flights(origin: str, destination: str, date: str) -> list:
     print(f"✈️ Calling Amadeus with origin={origin}, destination={destination}, date={date}")
 
     try:
         token = get_amadeus_token()
-        url = "https://test.api.amadeus.com/v2/shopping/flight-offers"
         headers = {"Authorization": f"Bearer {token}"}
-        params = {
-            "originLocationCode": origin,
-            "destinationLocationCode": destination,
-            "departureDate": date,
-            "adults": 1,
-            "currencyCode": "USD",
-            "max": 20
-        }
-
+        params = flight_params(origin, destination, date)
         print("📤 Request params:", params)
 
-        res = requests.get(url, headers=headers, params=params)
+        res = http_client.get(FLIGHT_OFFERS_URL, headers=headers, params=params)
+        return parse_flight_offers(res, origin, destination)
+
+    except Exception as e:
+        print("🔥 Exception during Amadeus call:", str(e))
+        return [{"error": f"Amadeus request failed: {e}"}]
+
+async def aquery_flights(origin: str, destination: str, date: str) -> list:
+    print(f"✈️ Calling Amadeus with origin={origin}, destination={destination}, date={date}")
+
+    try:
+        token = await aget_amadeus_token()
+        headers = {"Authorization": f"Bearer {token}"}
+        params = flight_params(origin, destination, date)
 
-        if res.status_code != 200:
-            print(f"🚨 Amadeus API Error {res.status_code}: {res.text}")
-            return []
+        res = await http_client.aget(FLIGHT_OFFERS_URL, headers=headers, params=params)
+        return parse_flight_offers(res, origin, destination)
 
-        data = res.json()
-        offers = data.get("data", [])
-        flights = []
+    except Exception as e:
+        print("🔥 Exception during Amadeus call:", str(e))
+        return [{"error": f"Amadeus request failed: {e}"}]
 
-        for offer in offers:
-            segments = offer["itineraries"][0]["segments"]
-            if not segments:
-                continue
+@telemetry.traced("tool.flights")
+async def async_search_flight_amadeus(origin: str, destination: str, date: str) -> list:
+    """Async variant of `search_flight_amadeus`."""
+    origin, destination, error = normalize_route(origin, destination)
+    if error:
+        collector.record("flights", error)
+        return error
+    flights = await result_cache.aget_or_compute(
+        "flights",
+        normalize_key(origin, destination, date),
+        lambda: aquery_flights(origin, destination, date),
+    )
+    collector.record("flights", flights)
+    return flights
 
-            first_seg = segments[0]
-            last_seg = segments[-1]
+def flex_queries(origin: str, destination: str, date: str, flex_days: int) -> list:
+    """
+    (origin, destination, date) combinations for a flexible search, closest dates first.
 
-            if first_seg["departure"]["iataCode"] != origin or last_seg["arrival"]["iataCode"] != destination:
-                continue
+    City codes expand to their airports and dates to ±`flex_days` (never before
+    today). Past `FLEX_MAX_QUERIES` the airports are searched together by city code.
+    """
+    try:
+        center = date_cls.fromisoformat(date)
+    except ValueError:
+        print(f"🚫 Invalid flight date: {date!r}")
+        return []
+    offsets = sorted(range(-flex_days, flex_days + 1), key=lambda d: (abs(d), d))
+    days = [center + timedelta(days=d) for d in offsets]
+    days = [d.isoformat() for d in days if d >= date_cls.today()]
 
-            carrier = first_seg.get("carrierCode", "Unknown")
-            price = offer["price"]["total"]
+    origins = sorted(airports.airport_codes(origin) - {origin}) or [origin]
+    destinations = sorted(airports.airport_codes(destination) - {destination}) or [destination]
+    queries = [(o, d, day) for day in days for o in origins for d in destinations]
+    if len(queries) > FLEX_MAX_QUERIES:
+        # Over budget: one city-code query per day still covers every airport
+        print(f"✂️ Flexible search over budget ({len(queries)} queries), searching by city code")
+        queries = [(origin, destination, day) for day in days]
+    return queries[:FLEX_MAX_QUERIES]
 
-            flights.append({
-                "airline": IATA_AIRLINES.get(carrier, carrier),
-                "from": first_seg["departure"]["iataCode"],
-                "to": last_seg["arrival"]["iataCode"],
-                "departure_time": first_seg["departure"]["at"],
-                "arrival_time": last_seg["arrival"]["at"],
-                "price": float(price)
-            })
+def merge_flights(results: list) -> list:
+    """Combine per-query flight lists, keeping the cheapest copy of each itinerary."""
+    best = {}
+    for flights in results:
+        for f in flights:
+            key = (f.airline, f.origin, f.destination, f.departure_time, f.arrival_time)
+            if key not in best or f.price < best[key].price:
+                best[key] = f
+    return sorted(best.values(), key=lambda f: f.price)
 
-        flights = sorted(flights, key=lambda f: f["price"])
-        collected_results["flights"] = flights[:6]
+def price_calendar(flights: list) -> list:
+    """Cheapest flight per departure day, in date order."""
+    cheapest = {}
+    for f in flights:
+        day = f.departure_time[:10]
+        if day not in cheapest or f.price < cheapest[day].price:
+            cheapest[day] = f
+    return [{"date": day, "price": f.price, "flight": f} for day, f in sorted(cheapest.items())]
 
-        print("✅ Flights collected:")
-        for f in flights[:6]:
-            print("  -", f)
+def flexible_result(results: list) -> dict:
+    # Days whose query failed are left out; only an outage on every day is an error
+    found = [r for r in results if result_cache.cacheable(r) or not r]
+    if results and not found:
+        collector.record("flights", results[0])
+        return {"flights": results[0], "calendar": []}
+    flights = merge_flights(found)
+    result = {"flights": flights[:6], "calendar": price_calendar(flights)}
+    collector.record("flights", result["flights"])
+    collector.record("flight_calendar", result["calendar"])
+    return result
 
-        return flights[:6]
+def cached_flights(origin: str, destination: str, date: str) -> list:
+    return result_cache.get_or_compute(
+        "flights",
+        normalize_key(origin, destination, date),
+        lambda: query_flights(origin, destination, date),
+    )
 
-    except Exception as e:
-        print("🔥 Exception during Amadeus call:", str(e))
-        return []
+@telemetry.traced("tool.flexible_flights")
+def search_flexible_flights(origin: str, destination: str, date: str, flex_days: int = 2) -> dict:
+    """
+    Search flights around a date from every airport of the origin city to every airport of the destination city.
+
+    Args:
+        origin: IATA airport or city code of departure (e.g., "NYC" searches JFK, LGA and EWR)
+        destination: IATA airport or city code of arrival (e.g., "CHI")
+        date: Preferred departure date (YYYY-MM-DD)
+        flex_days: How many days before and after `date` to search as well
+
+    Returns:
+        A dict with the cheapest `flights` overall and a `calendar` with the cheapest flight per day.
+    """
+    origin, destination, error = normalize_route(origin, destination)
+    if error:
+        collector.record("flights", error)
+        return {"flights": error, "calendar": []}
+
+    queries = flex_queries(origin, destination, date, flex_days)
+    futures = [collector.submit(flex_pool, cached_flights, *q) for q in queries]
+    return flexible_result([future.result() for future in futures])
+
+@telemetry.traced("tool.flexible_flights")
+async def async_search_flexible_flights(origin: str, destination: str, date: str, flex_days: int = 2) -> dict:
+    """Async variant of `search_flexible_flights`, bounded per event loop by `FLEX_CONCURRENCY`."""
+    origin, destination, error = normalize_route(origin, destination)
+    if error:
+        collector.record("flights", error)
+        return {"flights": error, "calendar": []}
+
+    semaphore = _flex_semaphores.setdefault(asyncio.get_running_loop(), asyncio.Semaphore(FLEX_CONCURRENCY))
+
+    async def run(o, d, day):
+        async with semaphore:
+            return await result_cache.aget_or_compute(
+                "flights", normalize_key(o, d, day), lambda: aquery_flights(o, d, day)
+            )
+
+    results = await asyncio.gather(*(run(*q) for q in flex_queries(origin, destination, date, flex_days)))
+    return flexible_result(results)
@@ -1,117 +1,206 @@
+import asyncio
 import os
-import requests
-from dotenv import load_dotenv
-from smolagents import tool
-from requests.models import PreparedRequest
-from collector import collected_results
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+import http_client
+import config
+import airports
+import collector
+import telemetry
+from records import Hotel
+from cache import place_cache, result_cache, normalize_key
+from amadeus_auth import get_amadeus_token, aget_amadeus_token, token_manager
 
-load_dotenv()
-AMADEUS_CLIENT_ID = os.getenv("AMADEUS_API_KEY")
-AMADEUS_CLIENT_SECRET = os.getenv("AMADEUS_SECRET")
+MAX_HOTELS = 6
+ENRICH_TIMEOUT = float(os.getenv("HOTEL_ENRICH_TIMEOUT", "5"))
+NO_ENRICHMENT = {"image": None, "maps_url": None, "address": None}
 
-def enrich_hotel_with_google_data(hotel_name: str, city: str = ""):
-    url = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
-    params = {
+# Shared across requests so concurrent trips cannot flood Google Places
+ENRICH_WORKERS = int(os.getenv("HOTEL_ENRICH_WORKERS", "8"))
+enrich_pool = ThreadPoolExecutor(max_workers=ENRICH_WORKERS)
+_enrich_semaphores = weakref.WeakKeyDictionary()
+
+# Hotel IDs per hotel-offers request, and how many of those requests run at once
+OFFER_CHUNK_SIZE = int(os.getenv("HOTEL_OFFER_CHUNK_SIZE", "20"))
+OFFER_CONCURRENCY = int(os.getenv("HOTEL_OFFER_CONCURRENCY", "3"))
+offer_pool = ThreadPoolExecutor(max_workers=OFFER_CONCURRENCY)
+
+PLACE_URL = "https://maps.googleapis.com/maps/api/place/findplacefromtext/json"
+HOTEL_IDS_URL = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
+HOTEL_OFFERS_URL = "https://test.api.amadeus.com/v3/shopping/hotel-offers"
+
+def place_params(hotel_name: str, city: str = "") -> dict:
+    return {
         "input": f"{hotel_name} {city}".strip(),
         "inputtype": "textquery",
         "fields": "place_id,photos,name,formatted_address",
         "key": os.getenv("GOOGLE_API_KEY")
     }
 
-    res = requests.get(url, params=params).json()
+def parse_place(res: dict):
     candidates = res.get("candidates", [])
     if not candidates:
-        return {"image": None, "maps_url": None}
+        return None
 
     hotel = candidates[0]
-    place_id = hotel.get("place_id")
+    # Store the photo reference rather than the photo URL so the API key never hits the cache
+    return {
+        "place_id": hotel.get("place_id"),
+        "photo_reference": hotel["photos"][0]["photo_reference"] if "photos" in hotel else None,
+        "address": hotel.get("formatted_address"),
+    }
+
+def lookup_place(hotel_name: str, city: str = ""):
+    """Resolve a hotel to its Google place, cached since place ids rarely change."""
+    key = normalize_key(hotel_name, city)
+    place = place_cache.get(key)
+    if place is not None:
+        return place
+
+    place = parse_place(http_client.get(PLACE_URL, params=place_params(hotel_name, city)).json())
+    if place:
+        place_cache.set(key, place)
+    return place
+
+async def alookup_place(hotel_name: str, city: str = ""):
+    """Async variant of `lookup_place`, sharing its cache."""
+    key = normalize_key(hotel_name, city)
+    place = place_cache.get(key)
+    if place is not None:
+        return place
+
+    res = await http_client.aget(PLACE_URL, params=place_params(hotel_name, city))
+    place = parse_place(res.json())
+    if place:
+        place_cache.set(key, place)
+    return place
+
+def place_enrichment(place) -> dict:
+    if not place:
+        return NO_ENRICHMENT
 
     # Optional image
-    if "photos" in hotel:
-        photo_ref = hotel["photos"][0]["photo_reference"]
+    if place["photo_reference"]:
         image_url = (
             f"https://maps.googleapis.com/maps/api/place/photo"
-            f"?maxwidth=400&photoreference={photo_ref}&key={os.getenv('GOOGLE_API_KEY')}"
+            f"?maxwidth=400&photoreference={place['photo_reference']}&key={os.getenv('GOOGLE_API_KEY')}"
         )
     else:
         image_url = None
 
-    maps_url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
-    return {"image": image_url, "maps_url": maps_url}
+    maps_url = f"https://www.google.com/maps/place/?q=place_id:{place['place_id']}"
+    return {"image": image_url, "maps_url": maps_url, "address": place.get("address")}
 
-def get_amadeus_token():
-    url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": AMADEUS_CLIENT_ID,
-        "client_secret": AMADEUS_CLIENT_SECRET,
-    }
-    res = requests.post(url, headers=headers, data=data)
-    return res.json()["access_token"]
+def enrich_hotel_with_google_data(hotel_name: str, city: str = ""):
+    return place_enrichment(lookup_place(hotel_name, city))
 
+async def aenrich_hotel_with_google_data(hotel_name: str, city: str = ""):
+    # Same bound as the thread pool, per event loop
+    loop = asyncio.get_running_loop()
+    semaphore = _enrich_semaphores.setdefault(loop, asyncio.Semaphore(ENRICH_WORKERS))
+    async with semaphore:
+        return place_enrichment(await alookup_place(hotel_name, city))
 
-def get_hotel_ids_by_city(city_code: str, token: str, radius_km: int = 5) -> list:
-    url = "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city"
-    params = {
+@telemetry.traced("enrich_hotels")
+def enrich_hotels(names: list, city: str = "") -> list:
+    """
+    Enrich hotels concurrently, keeping the input order.
+
+    A lookup that fails or is still running after `ENRICH_TIMEOUT` seconds
+    yields an empty enrichment instead of holding up the response.
+    """
+    futures = [collector.submit(enrich_pool, enrich_hotel_with_google_data, name, city) for name in names]
+    wait(futures, timeout=ENRICH_TIMEOUT)
+    return [enrichment_result(name, future) for name, future in zip(names, futures)]
+
+@telemetry.traced("enrich_hotels")
+async def aenrich_hotels(names: list, city: str = "") -> list:
+    """Async variant of `enrich_hotels` with the same ordering and timeout rules."""
+    tasks = [asyncio.ensure_future(aenrich_hotel_with_google_data(name, city)) for name in names]
+    if tasks:
+        await asyncio.wait(tasks, timeout=ENRICH_TIMEOUT)
+    return [enrichment_result(name, task) for name, task in zip(names, tasks)]
+
+def enrichment_result(name: str, future) -> dict:
+    if not future.done():
+        future.cancel()
+        print(f"⏱️ Google enrichment timed out for {name}")
+        return NO_ENRICHMENT
+    if future.exception() is not None:
+        print(f"❌ Google enrichment failed for {name}:", str(future.exception()))
+        return NO_ENRICHMENT
+    return future.result()
+
+def normalize_city_code(query: str):
+    """Hotel search needs a city code: "New York" and "JFK" both become "NYC"."""
+    code = airports.city_code(query)
+    if code is None:
+        print(f"🚫 Unknown city: {query!r}")
+        return None, [{"error": f"Unknown city: {query}"}]
+    return code, None
+
+def hotel_ids_params(city_code: str, radius_km: int = 5) -> dict:
+    return {
         "cityCode": city_code,
         "radius": radius_km,
         "radiusUnit": "KM",
         "hotelSource": "ALL"
     }
-    headers = {"Authorization": f"Bearer {token}"}
-    res = requests.get(url, headers=headers, params=params)
+
+def parse_hotel_ids(res) -> list:
+    if res.status_code == 401:
+        token_manager.invalidate()
     if res.status_code != 200:
         print("❌ Hotel ID fetch failed", res.status_code, res.text)
         return []
 
-    hotel_ids = [h["hotelId"] for h in res.json().get("data", []) if "hotelId" in h]
-    return hotel_ids[:20]
+    return [h["hotelId"] for h in res.json().get("data", []) if "hotelId" in h]
 
+def get_hotel_ids_by_city(city_code: str, token: str, radius_km: int = 5) -> list:
+    """Every hotel ID in the city, cached per city since the list rarely changes."""
+    def fetch():
+        headers = {"Authorization": f"Bearer {token}"}
+        res = http_client.get(HOTEL_IDS_URL, headers=headers, params=hotel_ids_params(city_code, radius_km))
+        return parse_hotel_ids(res)
 
-@tool
-def search_hotels_from_city(city_code: str, checkin_date: str) -> list:
-    """
-    Get hotel offers from a city by fetching hotel IDs first.
+    return result_cache.get_or_compute("hotel_ids", normalize_key(city_code, radius_km), fetch)
 
-    Args:
-        city_code: IATA code like "NYC"
-        checkin_date: "2025-05-10"
+async def afetch_hotel_ids(city_code: str, token: str, radius_km: int = 5) -> list:
+    headers = {"Authorization": f"Bearer {token}"}
+    res = await http_client.aget(HOTEL_IDS_URL, headers=headers, params=hotel_ids_params(city_code, radius_km))
+    return parse_hotel_ids(res)
 
-    Returns:
-        List of hotel dicts (name, price, rating, address)
-    """
-    token = get_amadeus_token()
-    hotel_ids = get_hotel_ids_by_city(city_code, token)
-    if not hotel_ids:
-        return [{"error": "No hotel IDs found."}]
+async def aget_hotel_ids_by_city(city_code: str, token: str, radius_km: int = 5) -> list:
+    return await result_cache.aget_or_compute(
+        "hotel_ids", normalize_key(city_code, radius_km), lambda: afetch_hotel_ids(city_code, token, radius_km)
+    )
 
-    url = "https://test.api.amadeus.com/v3/shopping/hotel-offers"
-    headers = {"Authorization": f"Bearer {token}"}
+def id_chunks(hotel_ids: list) -> list:
+    return [hotel_ids[i:i + OFFER_CHUNK_SIZE] for i in range(0, len(hotel_ids), OFFER_CHUNK_SIZE)]
+
+def offer_params(hotel_ids: list, checkin_date: str, checkout_date: str = "") -> dict:
     params = {
         "hotelIds": ",".join(hotel_ids),
         "checkInDate": checkin_date,
         "adults": 1,
         "roomQuantity": 1,
-        "bestRateOnly": True
+        "bestRateOnly": "true"
     }
+    # Without a check-out date Amadeus prices a single night
+    if checkout_date:
+        params["checkOutDate"] = checkout_date
+    return params
 
-    req = PreparedRequest()
-    req.prepare_url(url, params)
-    # print("🔗 Request URL:", req.url)
-
-    res = requests.get(url, headers=headers, params=params)
-    # print("📦 Raw response:", res.text)
-
+def hotel_offers(res):
+    """Priced, non-test hotels with their best rate from one offers response, or None if the request failed."""
+    if res.status_code == 401:
+        token_manager.invalidate()
     if res.status_code != 200:
-        return [{"error": f"Hotel offer error {res.status_code}"}]
+        print("❌ Hotel offer fetch failed", res.status_code, res.text)
+        return None
 
-    data = res.json().get("data", [])
-    results = []
-    seen = set()
-    results = []
-    seen = set()
-    for h in data:
+    offers = []
+    for h in res.json().get("data", []):
         hotel_info = h.get("hotel", {})
         name = hotel_info.get("name")
         
@@ -119,14 +208,160 @@ def search_hotels_from_city(city_code: str, checkin_date: str) -> list:
         if not name or "test" in name.lower() or "demo" in name.lower():
             continue
 
-        if name not in seen:
-            seen.add(name)
-            enrichment = enrich_hotel_with_google_data(name, city=city_code)
-            results.append({
-                "name": name,
-                "image": enrichment["image"],
-                "url": enrichment["maps_url"]
-            })
-
-    collected_results["hotels"] = results[:6]
-    return results[:6]
\ No newline at end of file
+        price = (h.get("offers") or [{}])[0].get("price", {})
+        if price.get("total") is None:
+            continue
+        offers.append({
+            "name": name,
+            "price": price["total"],
+            "currency": price.get("currency"),
+            "lat": hotel_info.get("latitude"),
+            "lng": hotel_info.get("longitude"),
+        })
+    return offers
+
+def merge_offers(found: list, offers: list) -> list:
+    """Add a chunk's offers to `found`, skipping duplicate names, up to `MAX_HOTELS`."""
+    seen = {o["name"] for o in found}
+    for offer in offers:
+        if len(found) == MAX_HOTELS:
+            break
+        if offer["name"] not in seen:
+            seen.add(offer["name"])
+            found.append(offer)
+    return found
+
+def fetch_offers(chunk: list, checkin_date: str, token: str, checkout_date: str = ""):
+    headers = {"Authorization": f"Bearer {token}"}
+    params = offer_params(chunk, checkin_date, checkout_date)
+    return hotel_offers(http_client.get(HOTEL_OFFERS_URL, headers=headers, params=params))
+
+async def afetch_offers(chunk: list, checkin_date: str, token: str, checkout_date: str = ""):
+    headers = {"Authorization": f"Bearer {token}"}
+    params = offer_params(chunk, checkin_date, checkout_date)
+    return hotel_offers(await http_client.aget(HOTEL_OFFERS_URL, headers=headers, params=params))
+
+def collect_offers(hotel_ids: list, checkin_date: str, token: str, checkout_date: str = ""):
+    """
+    Query the city's hotel IDs chunk by chunk, `OFFER_CONCURRENCY` chunks at a time,
+    stopping once `MAX_HOTELS` priced offers are found. Returns None if every request failed.
+    """
+    chunks = id_chunks(hotel_ids)
+    found, failed = [], 0
+    for i in range(0, len(chunks), OFFER_CONCURRENCY):
+        wave = chunks[i:i + OFFER_CONCURRENCY]
+        futures = [collector.submit(offer_pool, fetch_offers, chunk, checkin_date, token, checkout_date) for chunk in wave]
+        for future in futures:
+            try:
+                offers = future.result()
+            except Exception as e:
+                # Lose only this chunk's hotels, not the ones other requests found
+                print("❌ Hotel offer request failed:", str(e))
+                offers = None
+            if offers is None:
+                failed += 1
+            else:
+                merge_offers(found, offers)
+        if len(found) == MAX_HOTELS:
+            print(f"🏨 Found {MAX_HOTELS} hotels after {i + len(wave)} of {len(chunks)} offer requests")
+            break
+    return None if failed == len(chunks) else found
+
+async def acollect_offers(hotel_ids: list, checkin_date: str, token: str, checkout_date: str = ""):
+    """Async variant of `collect_offers`."""
+    chunks = id_chunks(hotel_ids)
+    found, failed = [], 0
+    for i in range(0, len(chunks), OFFER_CONCURRENCY):
+        wave = chunks[i:i + OFFER_CONCURRENCY]
+        results = await asyncio.gather(*(afetch_offers(chunk, checkin_date, token, checkout_date) for chunk in wave),
+                                       return_exceptions=True)
+        for offers in results:
+            if isinstance(offers, Exception):
+                print("❌ Hotel offer request failed:", str(offers))
+                offers = None
+            if offers is None:
+                failed += 1
+            else:
+                merge_offers(found, offers)
+        if len(found) == MAX_HOTELS:
+            print(f"🏨 Found {MAX_HOTELS} hotels after {i + len(wave)} of {len(chunks)} offer requests")
+            break
+    return None if failed == len(chunks) else found
+
+def build_hotels(offers: list, enrichments: list) -> list:
+    results = []
+    for offer, enrichment in zip(offers, enrichments):
+        results.append(Hotel(
+            name=offer["name"],
+            image=enrichment["image"],
+            url=enrichment["maps_url"],
+            address=enrichment["address"],
+            price=offer["price"],
+            currency=offer["currency"],
+            lat=offer.get("lat"),
+            lng=offer.get("lng"),
+        ))
+    return results
+
+
+@telemetry.traced("tool.hotels")
+def search_hotels_from_city(city_code: str, checkin_date: str, checkout_date: str = "") -> list:
+    """
+    Get hotel offers from a city by fetching hotel IDs first.
+
+    Args:
+        city_code: IATA city code like "NYC"; city names and airport codes are resolved too
+        checkin_date: "2025-05-10"
+        checkout_date: "2025-05-13" for a multi-night stay; one night when left empty
+
+    Returns:
+        List of Hotel records (name, image, url, address, price, currency)
+    """
+    city_code, error = normalize_city_code(city_code)
+    if error:
+        collector.record("hotels", error)
+        return error
+    hotels = result_cache.get_or_compute(
+        "hotels",
+        normalize_key(city_code, checkin_date, checkout_date),
+        lambda: query_hotels(city_code, checkin_date, checkout_date),
+    )
+    collector.record("hotels", hotels)
+    return hotels
+
+def query_hotels(city_code: str, checkin_date: str, checkout_date: str = "") -> list:
+    token = get_amadeus_token()
+    hotel_ids = get_hotel_ids_by_city(city_code, token)
+    if not hotel_ids:
+        return [{"error": "No hotel IDs found."}]
+
+    offers = collect_offers(hotel_ids, checkin_date, token, checkout_date)
+    if offers is None:
+        return [{"error": "Hotel offer requests failed."}]
+    return build_hotels(offers, enrich_hotels([o["name"] for o in offers], city=city_code))
+
+async def aquery_hotels(city_code: str, checkin_date: str, checkout_date: str = "") -> list:
+    token = await aget_amadeus_token()
+    hotel_ids = await aget_hotel_ids_by_city(city_code, token)
+    if not hotel_ids:
+        return [{"error": "No hotel IDs found."}]
+
+    offers = await acollect_offers(hotel_ids, checkin_date, token, checkout_date)
+    if offers is None:
+        return [{"error": "Hotel offer requests failed."}]
+    return build_hotels(offers, await aenrich_hotels([o["name"] for o in offers], city=city_code))
+
+@telemetry.traced("tool.hotels")
+async def async_search_hotels_from_city(city_code: str, checkin_date: str, checkout_date: str = "") -> list:
+    """Async variant of `search_hotels_from_city`."""
+    city_code, error = normalize_city_code(city_code)
+    if error:
+        collector.record("hotels", error)
+        return error
+    hotels = await result_cache.aget_or_compute(
+        "hotels",
+        normalize_key(city_code, checkin_date, checkout_date),
+        lambda: aquery_hotels(city_code, checkin_date, checkout_date),
+    )
+    collector.record("hotels", hotels)
+    return hotels
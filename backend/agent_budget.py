@@ -0,0 +1,114 @@
+import importlib.resources
+import os
+
+import yaml
+from smolagents.memory import ActionStep
+
+import collector
+import config
+import telemetry
+
+# Steps the CodeAgent may take; calling the tools and answering needs two or three
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "4"))
+# Prompt + completion tokens one agent run may spend before it is stopped
+AGENT_TOKEN_BUDGET = int(os.getenv("AGENT_TOKEN_BUDGET", "12000"))
+# Longest tool observation fed back into the agent's context, in characters
+OBSERVATION_CHARS = int(os.getenv("AGENT_OBSERVATION_CHARS", "600"))
+
+# Replaces smolagents' ~2k-token CodeAgent system prompt, which is resent on every
+# step; its worked examples use notional tools that don't exist here
+AGENT_SYSTEM_PROMPT = """You plan trips by writing Python code that calls the tools below.
+Answer in cycles of 'Thought:' then 'Code:' with a ```py block ending in '```<end_code>'.
+print() whatever you need to see in the next step, and call final_answer() when done.
+
+Example:
+Thought: I will search events and attractions for Chicago on 2025-05-09 together.
+Code:
+```py
+events = search_ticketmaster_events(location="Chicago", date="2025-05-09")
+attractions = get_popular_attractions(location="Chicago")
+print(len(events), len(attractions))
+```<end_code>
+
+Tools, callable as plain Python functions:
+{%- for tool in tools.values() %}
+- {{ tool.name }}: {{ tool.description }}
+    Takes inputs: {{tool.inputs}}
+    Returns an output of type: {{tool.output_type}}
+{%- endfor %}
+
+Rules:
+1. Always give a 'Thought:' and a 'Code:' block ending with '```<end_code>'.
+2. Pass tool arguments by keyword, never as a dict.
+3. Only use variables you defined; they persist between steps.
+4. Never repeat a tool call with the same arguments, and never name a variable after a tool.
+5. Imports are limited to: {{authorized_imports}}
+"""
+
+
+def prompt_templates() -> dict:
+    """smolagents' CodeAgent templates with the compact system prompt."""
+    source = importlib.resources.files("smolagents.prompts").joinpath("code_agent.yaml").read_text()
+    return {**yaml.safe_load(source), "system_prompt": AGENT_SYSTEM_PROMPT}
+
+
+def compact_observation(text: str, limit: int = OBSERVATION_CHARS) -> str:
+    """
+    Head of a step's observation plus a count of what each tool returned.
+
+    The full results are already in the collector for the response, so the agent
+    only needs enough to know which tools ran and whether they found anything.
+    """
+    if len(text) <= limit:
+        return text
+    counts = ", ".join(f"{section}: {len(collector.current_results()[section])}" for section in collector.TOOL_SECTIONS)
+    return f"{text[:limit].rstrip()}\n… [{len(text) - limit} characters trimmed] Results collected so far: {counts}"
+
+
+class StepBudget:
+    """
+    Step callback for one agent run.
+
+    Accounts the tokens of every step, trims its observation before the next step
+    sends it back to the model, and interrupts the run once `max_tokens` are spent.
+    """
+
+    def __init__(self, max_tokens: int = AGENT_TOKEN_BUDGET, observation_chars: int = OBSERVATION_CHARS):
+        self.max_tokens = max_tokens
+        self.observation_chars = observation_chars
+        # (step number, prompt tokens, completion tokens, observation characters trimmed)
+        self.steps = []
+        self.exhausted = False
+
+    @property
+    def spent(self) -> int:
+        return sum(prompt + completion for _, prompt, completion, _ in self.steps)
+
+    def __call__(self, step, agent):
+        if not isinstance(step, ActionStep):
+            return
+        message = step.model_output_message
+        usage = {} if message is None or getattr(message, "cached", False) else (getattr(message, "usage", None) or {})
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        telemetry.agent_step_tokens.observe("prompt", prompt)
+        telemetry.agent_step_tokens.observe("completion", completion)
+
+        trimmed = 0
+        if step.observations:
+            compact = compact_observation(step.observations, self.observation_chars)
+            trimmed = max(len(step.observations) - len(compact), 0)
+            step.observations = compact
+        self.steps.append((step.step_number, prompt, completion, trimmed))
+
+        if self.spent >= self.max_tokens and not self.exhausted:
+            self.exhausted = True
+            print(f"🧮 Agent spent {self.spent} of {self.max_tokens} tokens by step {step.step_number}; stopping")
+            agent.interrupt()
+
+    def format(self) -> str:
+        """e.g. "step 1 2210+96 tokens · step 2 1380+40 tokens (−1850 chars) · total 3726" """
+        parts = [
+            f"step {number} {prompt}+{completion} tokens" + (f" (−{trimmed} chars)" if trimmed else "")
+            for number, prompt, completion, trimmed in self.steps
+        ]
+        return " · ".join(parts + [f"total {self.spent}"])
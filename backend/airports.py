@@ -0,0 +1,160 @@
+import csv
+import difflib
+import math
+import os
+from array import array
+from functools import lru_cache
+
+AIRPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.csv")
+
+# Common nicknames and spellings -> canonical city name in airports.csv
+ALIASES = {
+    "nyc": "New York", "new york city": "New York", "manhattan": "New York",
+    "la": "Los Angeles", "sf": "San Francisco", "san fran": "San Francisco",
+    "vegas": "Las Vegas", "dc": "Washington", "washington dc": "Washington",
+    "washington d.c.": "Washington", "philly": "Philadelphia", "nola": "New Orleans",
+    "chi-town": "Chicago", "saint louis": "St. Louis", "st louis": "St. Louis",
+    "new delhi": "Delhi", "bombay": "Mumbai", "rio": "Rio de Janeiro",
+    "são paulo": "Sao Paulo", "bogotá": "Bogota", "montréal": "Montreal",
+    "zürich": "Zurich", "münchen": "Munich", "roma": "Rome", "milano": "Milan",
+    "lisboa": "Lisbon", "praha": "Prague", "wien": "Vienna", "firenze": "Florence",
+    "venezia": "Venice", "napoli": "Naples", "cancún": "Cancun",
+}
+
+# One tuple per airport plus flat coordinate arrays keeps the whole index in a few KB
+_airports = []  # (iata, city_code, city, country, name)
+_lat = array("d")
+_lng = array("d")
+_by_iata = {}
+_by_city_code = {}
+_city_names = {}
+
+with open(AIRPORTS_PATH, newline="", encoding="utf-8") as f:
+    for row in csv.DictReader(f):
+        _by_iata[row["iata"]] = len(_airports)
+        _airports.append((row["iata"], row["city_code"], row["city"], row["country"], row["name"]))
+        _lat.append(float(row["lat"]))
+        _lng.append(float(row["lng"]))
+        _by_city_code.setdefault(row["city_code"], []).append(row["iata"])
+        _city_names[row["city_code"]] = row["city"]
+
+_city_by_name = {city.lower(): code for code, city in _city_names.items()}
+_city_by_name.update({alias: _city_by_name[city.lower()] for alias, city in ALIASES.items()})
+
+
+def _airport_dict(i: int) -> dict:
+    iata, city_code, city, country, name = _airports[i]
+    return {"iata": iata, "city_code": city_code, "city": city, "country": country,
+            "name": name, "lat": _lat[i], "lng": _lng[i]}
+
+
+def _city_dict(code: str) -> dict:
+    airports = _by_city_code[code]
+    return {
+        "city": _city_names[code],
+        "city_code": code,
+        "country": _airports[_by_iata[airports[0]]][3],
+        "airports": list(airports),
+    }
+
+
+def city_codes() -> dict:
+    """Canonical city name -> IATA city (metro) code for every city in the index."""
+    return {city: code for code, city in _city_names.items()}
+
+
+def airport(code: str):
+    i = _by_iata.get(code.strip().upper())
+    return None if i is None else _airport_dict(i)
+
+
+def airport_codes(location: str) -> set:
+    """Airports a location code covers, e.g. "NYC" -> {"JFK", "LGA", "EWR"}; unknown codes cover themselves."""
+    code = location.strip().upper()
+    return set(_by_city_code.get(code, ())) | {code}
+
+
+def resolve_city(query: str):
+    """
+    Resolve a city name, alias, city code or airport code to its metro area.
+
+    "New York", "nyc", "NYC" and "JFK" all give New York / NYC with its airports;
+    small typos ("Chicgo") are matched fuzzily. Returns None when nothing fits.
+    """
+    code = _resolve_city_code(" ".join(query.split()))
+    return None if code is None else _city_dict(code)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_city_code(text: str):
+    if not text:
+        return None
+
+    name = text.lower()
+    if name not in _city_by_name and "," in name:
+        # "Paris, France" / "Austin, TX"
+        name = name.split(",")[0].strip()
+    if name in _city_by_name:
+        return _city_by_name[name]
+
+    code = text.upper()
+    if code in _by_city_code:
+        return code
+    if code in _by_iata:
+        return _airports[_by_iata[code]][1]
+
+    if len(name) >= 4:
+        match = difflib.get_close_matches(name, _city_by_name.keys(), n=1, cutoff=0.85)
+        if match:
+            return _city_by_name[match[0]]
+    return None
+
+
+def location_code(query: str):
+    """
+    Code to search flights with: airport codes are kept, anything else becomes the
+    city code. Unknown three-letter codes pass through since the index is not
+    exhaustive; unknown names give None.
+    """
+    code = query.strip().upper()
+    if code in _by_iata and code not in _by_city_code:
+        return code
+    resolved = _resolve_city_code(" ".join(query.split()))
+    if resolved:
+        return resolved
+    return code if len(code) == 3 and code.isalpha() else None
+
+
+def canonical_city(query: str) -> str:
+    """
+    Index spelling of a city, e.g. "NYC" and "new york city" -> "New York". Unknown
+    names and qualified ones ("Paris, TX") are returned unchanged.
+    """
+    found = None if "," in query else resolve_city(query)
+    return found["city"] if found else query
+
+
+def city_code(query: str):
+    """IATA city code for hotel searches ("JFK" -> "NYC"), with the same fallbacks as `location_code`."""
+    resolved = _resolve_city_code(" ".join(query.split()))
+    if resolved:
+        return resolved
+    code = query.strip().upper()
+    return code if len(code) == 3 and code.isalpha() else None
+
+
+def nearest_airports(lat: float, lng: float, limit: int = 1) -> list:
+    """Closest airports to a point by great-circle distance, nearest first."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    distances = []
+    for i in range(len(_airports)):
+        lat2, lng2 = math.radians(_lat[i]), math.radians(_lng[i])
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distances.append((6371.0 * 2 * math.asin(math.sqrt(a)), i))
+
+    nearest = []
+    for km, i in sorted(distances)[:limit]:
+        entry = _airport_dict(i)
+        entry["distance_km"] = round(km, 1)
+        nearest.append(entry)
+    return nearest
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+import time
+import config
+import http_client
+
+AMADEUS_TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
+
+
+class AmadeusTokenManager:
+    """
+    Process-wide cache for the Amadeus client-credentials bearer token.
+
+    The token is reused until `refresh_margin` seconds before its `expires_in`.
+    While the token is in use, a background timer refreshes it ahead of expiry so
+    callers normally never wait on the OAuth endpoint. If several requests find the
+    token expired at once, only one of them performs the refresh.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, token_url=AMADEUS_TOKEN_URL, refresh_margin=60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._used = False
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _is_fresh(self):
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    def get_token(self) -> str:
+        self._used = True
+        if self._is_fresh():
+            return self._token
+
+        with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not self._is_fresh():
+                self._refresh()
+            return self._token
+
+    async def aget_token(self) -> str:
+        """Async variant of `get_token`; only a refresh leaves the event loop."""
+        if self._is_fresh():
+            self._used = True
+            return self._token
+        return await asyncio.to_thread(self.get_token)
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after Amadeus answers 401."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _refresh(self):
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id or os.getenv("AMADEUS_API_KEY"),
+            "client_secret": self.client_secret or os.getenv("AMADEUS_SECRET"),
+        }
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        res = http_client.post(self.token_url, headers=headers, data=data)
+        res.raise_for_status()
+        body = res.json()
+
+        expires_in = float(body.get("expires_in", 1799))
+        self._token = body["access_token"]
+        self._expires_at = time.monotonic() + max(expires_in - self.refresh_margin, 0)
+        self._used = False
+        self._schedule_refresh(expires_in - 2 * self.refresh_margin)
+
+    def _schedule_refresh(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 1), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        # Idle processes let the token lapse instead of refreshing forever
+        if not self._used:
+            return
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                # Keep the current token; the next caller refreshes synchronously once it expires
+                print("⚠️ Background Amadeus token refresh failed:", str(e))
+
+
+token_manager = AmadeusTokenManager()
+
+
+def get_amadeus_token() -> str:
+    return token_manager.get_token()
+
+
+async def aget_amadeus_token() -> str:
+    return await token_manager.aget_token()
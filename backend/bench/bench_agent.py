@@ -0,0 +1,139 @@
+"""
+Offline benchmark of `run_agent` at several concurrency levels.
+
+Starts the stand-in upstreams (bench/standin.py) in-process, or replays recorded
+cassettes with --replay, then calls the endpoint function directly and reports
+p50/p95/p99 latency and throughput per level:
+
+    python bench/bench_agent.py --concurrency 1,4,16 --requests 32
+    python bench/bench_agent.py --save bench/baseline.json
+    python bench/bench_agent.py --baseline bench/baseline.json   # exits 1 on a p95 regression
+    python bench/bench_agent.py --replay cassettes                # HTTP_CASSETTE_MODE=record output
+    python bench/bench_agent.py --agent                           # the CodeAgent fallback instead of the fast plan
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date as date_cls, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from stats import summarize, print_table, regressions
+
+CITIES = ["Chicago", "New York", "Los Angeles", "Seattle", "Miami", "Denver", "Austin", "San Francisco"]
+
+
+def start_standin(port: int, args):
+    import uvicorn
+    import standin
+
+    standin.settings.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            llm_latency_ms=args.llm_latency_ms, error_rate=args.error_rate)
+    server = uvicorn.Server(uvicorn.Config(standin.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def prompts(n: int, offset: int, warm: bool) -> list:
+    """Distinct city/date pairs so every request misses the result caches, unless `warm`."""
+    start = date_cls.today() + timedelta(days=30)
+    out = []
+    for i in range(n):
+        k = i if warm else offset + i
+        day = start + timedelta(days=k // len(CITIES) % 300)
+        out.append(f"Plan a trip from Boston to {CITIES[k % len(CITIES)]} on {day.isoformat()}")
+    return out
+
+
+def llm_tokens() -> float:
+    import telemetry
+
+    return sum(telemetry.llm_tokens._values.values())
+
+
+async def run_level(main, concurrency: int, batch: list) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    tokens_before = llm_tokens()
+
+    async def one(prompt):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            res = await main.run_agent(main.PromptRequest(prompt=prompt))
+            latencies.append(time.perf_counter() - started)
+            if isinstance(res, dict) and "error" in res:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in batch))
+    row = {"concurrency": concurrency, **summarize(latencies, time.perf_counter() - started, errors)}
+    row["tokens_per_trip"] = round((llm_tokens() - tokens_before) / len(batch)) if batch else 0
+    return row
+
+
+async def run(args) -> list:
+    import main  # imported after the environment points it at the stand-in
+
+    rows, offset = [], 0
+    await main.run_agent(main.PromptRequest(prompt=prompts(1, 10_000, False)[0]))  # warm up imports and pools
+    for concurrency in args.concurrency:
+        batch = prompts(args.requests, offset, args.warm)
+        offset += len(batch)
+        rows.append(await run_level(main, concurrency, batch))
+    await main.http_client.aclose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=600)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--warm", action="store_true", help="repeat the same prompts so caches are hot")
+    parser.add_argument("--agent", action="store_true", help="plan trips with the CodeAgent (FAST_PLAN=0)")
+    parser.add_argument("--replay", metavar="DIR", help="answer from recorded cassettes instead of the stand-in")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare p95 against a saved run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    # Benchmarks must never reach the real upstreams
+    if args.replay:
+        os.environ.update(HTTP_CASSETTE_MODE="replay", HTTP_CASSETTE_DIR=args.replay)
+    else:
+        os.environ["HTTP_UPSTREAM_OVERRIDE"] = f"http://127.0.0.1:{args.port}"
+        start_standin(args.port, args)
+    if args.agent:
+        os.environ["FAST_PLAN"] = "0"
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+    # The stand-in has no quotas; measure the backend, not the provider rate limits
+    os.environ.setdefault("UPSTREAM_RATE_LIMITS", "")
+
+    rows = asyncio.run(run(args))
+    print_table(rows)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(rows, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(rows, json.load(f), args.tolerance)
+        for line in slower:
+            print("🐢 Regression:", line)
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
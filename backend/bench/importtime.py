@@ -0,0 +1,94 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to `import main`.
+
+Runs `python -X importtime -c "import main"` several times in new processes and
+reports the median import time, the process wall time and the slowest modules
+by cumulative import time:
+
+    python bench/importtime.py --runs 5 --top 15
+    python bench/importtime.py --save bench/importtime.json
+    python bench/importtime.py --baseline bench/importtime.json   # exits 1 on a regression
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Cumulative microseconds per module from -X importtime output; nested imports are indented."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def import_once(module: str) -> tuple:
+    """(module -> cumulative µs, process wall seconds) for one cold import."""
+    # Keep settings from a developer's .env (warm cities, Redis) out of the measurement
+    env = {**os.environ, "WARM_CITIES": "", "RESULT_CACHE_URL": "", "UPSTREAM_STATE_URL": ""}
+    started = time.perf_counter()
+    done = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if done.returncode != 0:
+        sys.exit(f"import {module} failed:\n{done.stderr[-2000:]}")
+    return parse_importtime(done.stderr), wall
+
+
+def measure(module: str, runs: int) -> dict:
+    samples = [import_once(module) for _ in range(runs)]
+    names = set().union(*(modules for modules, _ in samples))
+    slowest = {name: statistics.median(modules.get(name, 0) for modules, _ in samples) / 1000 for name in names}
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": round(slowest.get(module, 0), 1),
+        "wall_ms": round(statistics.median(wall for _, wall in samples) * 1000, 1),
+        "modules_ms": {name: round(ms, 1) for name, ms in sorted(slowest.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def print_report(result: dict, top: int):
+    print(f"import {result['module']}: {result['import_ms']} ms (process {result['wall_ms']} ms, median of {result['runs']})")
+    # The first entry is the module itself
+    for name, ms in list(result["modules_ms"].items())[1:top + 1]:
+        print(f"{ms:>10.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare the import time against a saved run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed import time growth over the baseline")
+    args = parser.parse_args()
+
+    result = measure(args.module, args.runs)
+    print_report(result, args.top)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            before = json.load(f)["import_ms"]
+        if result["import_ms"] > before * (1 + args.tolerance):
+            print(f"🐢 Regression: import {args.module} {before} -> {result['import_ms']} ms")
+            sys.exit(1)
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+wrk-style HTTP load against a running backend.
+
+Keeps N requests in flight for a fixed duration per concurrency level and
+reports p50/p95/p99 latency and throughput:
+
+    python bench/standin.py &
+    HTTP_UPSTREAM_OVERRIDE=http://127.0.0.1:9100 uvicorn main:app --port 8000 --workers 4 &
+    python bench/load.py --url http://127.0.0.1:8000/api/agent --concurrency 8,32 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from stats import summarize, print_table
+
+CITIES = ["Chicago", "New York", "Los Angeles", "Seattle", "Miami", "Denver", "Austin", "San Francisco"]
+
+
+async def run_level(url: str, concurrency: int, duration: float, timeout: float) -> dict:
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+    counter = 0
+
+    async def worker(client):
+        nonlocal errors, counter
+        while time.monotonic() < deadline:
+            counter += 1
+            prompt = f"Plan a trip from Boston to {CITIES[counter % len(CITIES)]} next Friday"
+            started = time.perf_counter()
+            try:
+                res = await client.post(url, json={"prompt": prompt})
+                ok = res.status_code == 200 and "error" not in res.json()
+            except (httpx.HTTPError, json.JSONDecodeError):
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return {"concurrency": concurrency, **summarize(latencies, wall, errors)}
+
+
+async def run(args) -> list:
+    return [await run_level(args.url, c, args.duration, args.timeout) for c in args.concurrency]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/agent")
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    print_table(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-in for Google, Ticketmaster, Amadeus and OpenRouter.
+
+Serves the JSON fixtures in bench/fixtures with injected latency and errors so
+the backend can be exercised without network access:
+
+    python bench/standin.py --port 9100 --latency-ms 80 --llm-latency-ms 600 --error-rate 0.02
+    HTTP_UPSTREAM_OVERRIDE=http://127.0.0.1:9100 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+from datetime import date as date_cls, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Injected behaviour; main() fills these from the command line
+settings = {"latency_ms": 80.0, "jitter_ms": 40.0, "llm_latency_ms": 600.0, "error_rate": 0.0}
+
+app = FastAPI()
+_fixtures = {}
+
+
+def fixture(name: str, **values) -> dict:
+    """Load a fixture, filling "{placeholders}" with request values."""
+    if name not in _fixtures:
+        with open(os.path.join(FIXTURES_DIR, f"{name}.json"), encoding="utf-8") as f:
+            _fixtures[name] = f.read()
+    text = _fixtures[name]
+    for key, value in values.items():
+        text = text.replace("{" + key + "}", json.dumps(str(value))[1:-1])
+    return json.loads(text)
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    llm = request.url.path.startswith("/api/v1/")
+    base = settings["llm_latency_ms"] if llm else settings["latency_ms"]
+    delay = max(base + random.uniform(-settings["jitter_ms"], settings["jitter_ms"]), 0) / 1000
+    await asyncio.sleep(delay)
+    if random.random() < settings["error_rate"]:
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+    return await call_next(request)
+
+
+@app.post("/v1/security/oauth2/token")
+async def amadeus_token():
+    return {"access_token": "standin-token", "expires_in": 1799, "token_type": "Bearer"}
+
+
+@app.get("/v2/shopping/flight-offers")
+async def flight_offers(originLocationCode: str, destinationLocationCode: str, departureDate: str):
+    return fixture("flight_offers", origin=originLocationCode, destination=destinationLocationCode, date=departureDate)
+
+
+@app.get("/v1/reference-data/locations/hotels/by-city")
+async def hotel_ids(cityCode: str):
+    return fixture("hotel_ids")
+
+
+@app.get("/v3/shopping/hotel-offers")
+async def hotel_offers(hotelIds: str, checkInDate: str):
+    # Roughly half the properties have availability
+    data = []
+    for hotel_id in hotelIds.split(","):
+        if sum(map(ord, hotel_id)) % 2:
+            continue
+        price = 120 + sum(map(ord, hotel_id)) % 180
+        data.append({
+            "hotel": {"hotelId": hotel_id, "name": f"Stand-in Hotel {hotel_id[-3:]}",
+                      "latitude": 42.35 + price % 7 / 1000, "longitude": -71.06 - price % 11 / 1000},
+            "offers": [{"checkInDate": checkInDate, "price": {"currency": "USD", "total": f"{price}.00"}}],
+        })
+    return {"data": data}
+
+
+@app.get("/discovery/v2/events.json")
+async def events(request: Request):
+    start = request.query_params.get("startDateTime", "2025-01-01T00:00:00Z")
+    end = request.query_params.get("endDateTime")
+    if not end:
+        return fixture("events", date=start[:10])
+
+    # Date-range search: the fixture's events on every day, paged like the Discovery API
+    first, last = date_cls.fromisoformat(start[:10]), date_cls.fromisoformat(end[:10])
+    found = []
+    for offset in range((last - first).days):
+        found += fixture("events", date=(first + timedelta(days=offset)).isoformat())["_embedded"]["events"]
+    size = int(request.query_params.get("size", 20))
+    page = int(request.query_params.get("page", 0))
+    return {
+        "_embedded": {"events": found[page * size:(page + 1) * size]},
+        "page": {"size": size, "number": page, "totalElements": len(found), "totalPages": -(-len(found) // size)},
+    }
+
+
+@app.get("/maps/api/geocode/json")
+async def geocode():
+    return fixture("geocode")
+
+
+@app.get("/maps/api/place/nearbysearch/json")
+async def nearby():
+    return fixture("nearby")
+
+
+@app.get("/maps/api/place/findplacefromtext/json")
+async def find_place(input: str = ""):
+    return fixture("place", input=input)
+
+
+# Trip details in a CodeAgent task, e.g. "... to Chicago on 2025-05-09"
+TRIP_RE = re.compile(r"to ([A-Z][\w ]+?) on (\d{4}-\d{2}-\d{2})")
+
+
+def message_text(messages: list) -> list:
+    texts = []
+    for msg in messages:
+        content = msg.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        texts.append(content)
+    return texts
+
+
+def agent_step(messages: list) -> str:
+    """A CodeAgent step: call the four tools first, then give the final answer."""
+    steps = fixture("agent_steps")
+    if any(msg.get("role") == "assistant" for msg in messages):
+        return steps["final"]
+    match = TRIP_RE.search(" ".join(message_text(messages)))
+    city, date = match.groups() if match else ("Chicago", "2025-05-09")
+    return fixture("agent_steps", city=city, date=date)["call_tools"]
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    completion = fixture("chat_completion", model=body.get("model", ""))
+    messages = body.get("messages", [])
+    if "<end_code>" in (body.get("stop") or body.get("stop_sequences") or []):
+        completion["choices"][0]["message"]["content"] = agent_step(messages)
+
+    # Roughly four characters per token, so prompt size and max_tokens show up in the usage
+    content = completion["choices"][0]["message"]["content"]
+    prompt_tokens = sum(len(text) for text in message_text(messages)) // 4
+    completion_tokens = min(len(content) // 4, body.get("max_tokens") or len(content))
+    completion["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                           "total_tokens": prompt_tokens + completion_tokens}
+    if not body.get("stream"):
+        return completion
+
+    async def frames():
+        for word in completion["choices"][0]["message"]["content"].split(" "):
+            chunk = {"choices": [{"delta": {"content": word + " "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield f"data: {json.dumps({'choices': [], 'usage': completion['usage']})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(frames(), media_type="text/event-stream")
+
+
+@app.get("/maps/api/place/photo")
+async def photo():
+    return Response(status_code=204)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=settings["jitter_ms"])
+    parser.add_argument("--llm-latency-ms", type=float, default=settings["llm_latency_ms"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"])
+    args = parser.parse_args()
+
+    settings.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    llm_latency_ms=args.llm_latency_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Latency summaries shared by the benchmark scripts."""
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: list, wall_seconds: float, errors: int = 0) -> dict:
+    """p50/p95/p99 in milliseconds plus throughput for one run."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        "rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+def print_table(rows: list):
+    print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8}"
+          f" {'tokens/trip':>11}")
+    for row in rows:
+        print(f"{row['concurrency']:>11} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9} {row['rps']:>8} {row.get('tokens_per_trip', '-'):>11}")
+
+
+def regressions(rows: list, baseline: list, tolerance: float) -> list:
+    """Concurrency levels whose p95 grew by more than `tolerance` (0.2 = 20%) over the baseline."""
+    previous = {row["concurrency"]: row for row in baseline}
+    slower = []
+    for row in rows:
+        before = previous.get(row["concurrency"])
+        if before and before["p95_ms"] and row["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            slower.append(f"concurrency {row['concurrency']}: p95 {before['p95_ms']} -> {row['p95_ms']} ms")
+    return slower
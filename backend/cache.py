@@ -0,0 +1,345 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+import records
+
+# Optional on-disk store shared by every cache; leave unset for memory only
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+# Redis (or any Redis-compatible server) shared by all workers for tool results
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "")
+# Seconds to stop trying that server after a failed call, so an outage costs one timeout per window
+RESULT_CACHE_RETRY = float(os.getenv("RESULT_CACHE_RETRY", "10"))
+
+# Seconds to keep each tool's results: prices move fast, landmarks don't
+TOOL_TTLS = {
+    "flights": 10 * 60,
+    "hotels": 30 * 60,
+    "events": 60 * 60,
+    "attractions": 24 * 3600,
+    "hotel_ids": 24 * 3600,
+}
+
+_MISSING = object()
+_caches = {}
+
+
+class TTLCache:
+    """
+    In-memory LRU cache with per-entry TTLs and an optional SQLite backing store.
+
+    Memory misses fall through to SQLite (when `db_path` is set) so warm entries
+    survive restarts and are shared by workers on the same host. Values stored on
+    disk must be JSON-serializable (tool records included).
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, db_path: str = CACHE_DB_PATH):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT, key TEXT, value TEXT, expires_at REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+        _caches[name] = self
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            value = self._disk_get(key, now)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                    (self.name, key, records.dumps_tagged(value).decode(), expires_at),
+                )
+                self._db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.name, key))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _remember(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _disk_get(self, key, now):
+        if self._db is None:
+            return _MISSING
+        row = self._db.execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.name, key)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return _MISSING
+        value = records.loads_tagged(row[0])
+        self._remember(key, value, row[1])
+        return value
+
+
+class MemoryBackend:
+    """Per-process result store."""
+
+    def __init__(self, maxsize: int = 4096, name: str = "tool_results_memory"):
+        self.cache = TTLCache(name, maxsize=maxsize, db_path="")
+
+    def get(self, key: str):
+        return self.cache.get(key)
+
+    def set(self, key: str, value, ttl: float):
+        self.cache.set(key, value, ttl)
+
+    async def aget(self, key: str):
+        return self.get(key)
+
+    async def aset(self, key: str, value, ttl: float):
+        self.set(key, value, ttl)
+
+
+class RedisBackend:
+    """
+    Result store on a Redis-compatible server so every worker shares hits.
+
+    The async methods run the calls in a worker thread, off the event loop. After
+    a failed call the server is left alone for `RESULT_CACHE_RETRY` seconds:
+    lookups are misses and nothing is stored.
+    """
+
+    def __init__(self, url: str, prefix: str = "travel-agent:"):
+        import redis  # optional dependency, only needed when RESULT_CACHE_URL is set
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self.prefix = prefix
+        self.failing = False
+        self.retry_at = 0.0
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def _failed(self, e: Exception):
+        # Log once per outage rather than on every retry
+        if not self.failing:
+            print("⚠️ Result cache unreachable, querying upstreams directly:", str(e))
+        self.failing = True
+        self.retry_at = time.monotonic() + RESULT_CACHE_RETRY
+
+    def get(self, key: str):
+        if not self._available():
+            return None
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception as e:
+            self._failed(e)
+            return None
+        self.failing = False
+        return None if raw is None else records.loads_tagged(raw)
+
+    def set(self, key: str, value, ttl: float):
+        if not self._available():
+            return
+        try:
+            self.client.set(self.prefix + key, records.dumps_tagged(value), ex=max(int(ttl), 1))
+        except Exception as e:
+            self._failed(e)
+
+    async def aget(self, key: str):
+        if not self._available():
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value, ttl: float):
+        if self._available():
+            await asyncio.to_thread(self.set, key, value, ttl)
+
+
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    Tool result cache keyed by (tool, normalized arguments).
+
+    Concurrent misses for the same key are coalesced: the first caller runs the
+    upstream query and the others wait for its result. Empty results and
+    `{"error": ...}` entries are never stored.
+    """
+
+    def __init__(self, backend, ttls: dict = None):
+        self.backend = backend
+        self.ttls = ttls or TOOL_TTLS
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, tool: str, key: str, compute):
+        full_key = f"{tool}:{key}"
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            call = self._inflight.get(full_key)
+            leader = call is None
+            if leader:
+                call = self._inflight[full_key] = _InflightCall()
+
+        if not leader:
+            self.coalesced += 1
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        self.misses += 1
+        try:
+            call.value = compute()
+            if self.cacheable(call.value):
+                self.backend.set(full_key, call.value, self.ttls.get(tool, 600))
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(full_key, None)
+            call.done.set()
+
+    async def aget_or_compute(self, tool: str, key: str, compute):
+        """Async variant of `get_or_compute`; `compute` is a coroutine function."""
+        full_key = f"{tool}:{key}"
+        # A lookup already in flight for this key: wait for it rather than ask the backend too
+        future = self._async_inflight.get(full_key)
+        if future is None:
+            value = await self.backend.aget(full_key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._async_inflight.get(full_key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        return await self._acompute(tool, full_key, compute)
+
+    async def arefresh(self, tool: str, key: str, compute):
+        """
+        Recompute and store an entry whether or not it is cached, e.g. ahead of its
+        expiry; misses for the same key meanwhile wait for this call.
+        """
+        full_key = f"{tool}:{key}"
+        future = self._async_inflight.get(full_key)
+        if future is not None:
+            return await asyncio.shield(future)
+        return await self._acompute(tool, full_key, compute)
+
+    async def _acompute(self, tool: str, full_key: str, compute):
+        # Its own task, so a caller that is cancelled (e.g. its request timed out)
+        # leaves the computation running for the other callers waiting on it
+        task = asyncio.ensure_future(self._astore(tool, full_key, compute))
+        task.add_done_callback(_retrieve)
+        self._async_inflight[full_key] = task
+        return await asyncio.shield(task)
+
+    async def _astore(self, tool: str, full_key: str, compute):
+        try:
+            value = await compute()
+            if self.cacheable(value):
+                await self.backend.aset(full_key, value, self.ttls.get(tool, 600))
+            return value
+        finally:
+            self._async_inflight.pop(full_key, None)
+
+    @staticmethod
+    def cacheable(value) -> bool:
+        if not value:
+            return False
+        if isinstance(value, list):
+            return not any(isinstance(item, dict) and "error" in item for item in value)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def _retrieve(task: asyncio.Task):
+    # Mark the error seen when every caller has gone, so asyncio doesn't log it as unhandled
+    if not task.cancelled():
+        task.exception()
+
+
+def normalize_key(*parts) -> str:
+    """Case- and whitespace-insensitive key, e.g. (" New  York ",) -> "new york"."""
+    return "|".join(" ".join(str(p).lower().split()) for p in parts)
+
+
+def stats() -> dict:
+    """Hit/miss metrics for every cache created in this process."""
+    return {**{name: c.stats() for name, c in _caches.items()}, "tool_results": result_cache.stats()}
+
+
+# City coordinates and place ids practically never change
+geocode_cache = TTLCache("geocode", maxsize=2048, ttl=30 * 24 * 3600)
+place_cache = TTLCache("place", maxsize=8192, ttl=7 * 24 * 3600)
+result_cache = ResultCache(RedisBackend(RESULT_CACHE_URL) if RESULT_CACHE_URL else MemoryBackend())
@@ -1,6 +1,66 @@
-collected_results = {
-    "events": [],
-    "hotels": [],
-    "flights": [],
-    "attractions": []
-}
\ No newline at end of file
+from contextvars import ContextVar, copy_context
+
+SECTIONS = ("events", "hotels", "flights", "attractions", "flight_calendar", "days")
+# Sections every plan is expected to fill, one per search tool
+TOOL_SECTIONS = ("events", "hotels", "flights", "attractions")
+# Statuses that mean a section is missing data it could have had
+INCOMPLETE = {"error", "timeout", "skipped"}
+
+# Results of the trip plan being built in the current request (thread or task)
+_current_results = ContextVar("collected_results", default=None)
+# Per-section status of the same request: ok, empty, error, timeout or skipped
+_current_status = ContextVar("section_status", default=None)
+
+
+def new_results() -> dict:
+    """Start an empty result set for the current request and make it current."""
+    results = {section: [] for section in SECTIONS}
+    _current_results.set(results)
+    _current_status.set({})
+    return results
+
+
+def current_results() -> dict:
+    results = _current_results.get()
+    if results is None:
+        results = new_results()
+    return results
+
+
+def record(section: str, items: list):
+    """Called by the tools to store their output for the current request."""
+    # Tools report failures as [{"error": ...}]; those stay out of the response
+    if any(isinstance(item, dict) and "error" in item for item in items):
+        mark(section, "error")
+        return
+    current_results()[section] = items
+    mark(section, "ok" if items else "empty")
+
+
+def mark(section: str, status: str):
+    statuses = _current_status.get()
+    if statuses is None:
+        current_results()
+        statuses = _current_status.get()
+    statuses[section] = status
+
+
+def status(section: str):
+    return (_current_status.get() or {}).get(section)
+
+
+def status_report(missing: str = "skipped") -> tuple:
+    """
+    (statuses, partial) for the current request. Tool sections that never reported
+    get `missing`; the plan is partial when any section lacks data it could have had.
+    """
+    statuses = dict(_current_status.get() or {})
+    for section in TOOL_SECTIONS:
+        statuses.setdefault(section, missing)
+    return statuses, any(status in INCOMPLETE for status in statuses.values())
+
+
+def submit(executor, fn, *args, **kwargs):
+    """Submit to an executor so the worker thread writes into the caller's results."""
+    ctx = copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
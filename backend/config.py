@@ -0,0 +1,9 @@
+"""
+Loads `.env` into the environment, once per process.
+
+Every module that reads settings with os.getenv at import imports this first,
+so the order modules are imported in no longer matters.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,80 @@
+"""
+Measure the rule-based metadata extractor against the labeled prompts in
+data/extraction_cases.jsonl, optionally side by side with the LLM path.
+
+    python eval_extraction.py          # local extractor only, no network
+    python eval_extraction.py --llm    # also the LLM and the local-first hybrid (needs OPENROUTER_API_KEY)
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date as date_cls
+
+import airports
+import local_extractor
+
+CASES_PATH = os.path.join(os.path.dirname(__file__), "data", "extraction_cases.jsonl")
+FIELDS = ("city", "date", "origin", "days")
+
+
+def load_cases(path=CASES_PATH):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def field_matches(field, expected, actual) -> bool:
+    if field in ("city", "origin"):
+        return airports.canonical_city(actual or "").lower() == (expected or "").lower()
+    if field == "days":
+        return expected is None or actual == expected
+    return (actual or "") == (expected or "")
+
+
+def score(name, cases, extract):
+    correct = {f: 0 for f in FIELDS}
+    exact = 0
+    confident = confident_exact = 0
+    elapsed = 0.0
+
+    for case in cases:
+        today = date_cls.fromisoformat(case["today"])
+        started = time.perf_counter()
+        result = extract(case["prompt"], today)
+        elapsed += time.perf_counter() - started
+
+        hits = {f: field_matches(f, case[f], result.get(f)) for f in FIELDS}
+        for f in FIELDS:
+            correct[f] += hits[f]
+        exact += all(hits.values())
+        if result.get("confidence", 1.0) >= float(os.getenv("LOCAL_EXTRACT_CONFIDENCE", "0.8")):
+            confident += 1
+            confident_exact += all(hits.values())
+        elif name == "local":
+            print(f"   low confidence: {case['prompt']!r}")
+
+    n = len(cases)
+    print(f"{name:>7}: exact {exact}/{n} ({exact / n:.0%}) · "
+          + " · ".join(f"{f} {correct[f] / n:.0%}" for f in FIELDS)
+          + f" · {elapsed / n * 1000:.3f} ms/prompt")
+    if name == "local":
+        print(f"         confident on {confident}/{n}, exact when confident {confident_exact}/{max(confident, 1)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also score the LLM and hybrid extraction paths")
+    args = parser.parse_args()
+
+    cases = load_cases()
+    score("local", cases, local_extractor.extract)
+
+    if args.llm:
+        import main as app
+
+        score("llm", cases, app.llm_extract_metadata)
+        score("hybrid", cases, app.extract_metadata)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+import config
+import resilience
+import telemetry
+
+# (connect, read) timeouts in seconds; LLM calls pass their own longer read timeout
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "20")),
+)
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.3"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "5"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Send every upstream call to a local stand-in instead (see bench/standin.py),
+# e.g. http://127.0.0.1:9100; the real host travels in X-Upstream-Host
+UPSTREAM_OVERRIDE = os.getenv("HTTP_UPSTREAM_OVERRIDE", "").rstrip("/")
+# "record" saves upstream responses under CASSETTE_DIR, "replay" answers from them offline
+CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE", "")
+CASSETTE_DIR = os.getenv("HTTP_CASSETTE_DIR", "cassettes")
+# Never written to cassettes or used in their keys
+SECRET_FIELDS = {"key", "apikey", "api_key", "client_id", "client_secret", "access_token"}
+
+# Friendly names for the upstreams we talk to; anything else is keyed by host
+UPSTREAMS = {
+    "maps.googleapis.com": "google",
+    "app.ticketmaster.com": "ticketmaster",
+    "test.api.amadeus.com": "amadeus",
+    "api.amadeus.com": "amadeus",
+    "openrouter.ai": "openrouter",
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_stats = defaultdict(lambda: defaultdict(int))
+_stats_lock = threading.Lock()
+
+# time.monotonic() by which the current request must be done; None means unbounded
+_deadline = ContextVar("http_deadline", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The request's time budget ran out before an upstream call could be sent."""
+
+
+def upstream_name(url: str) -> str:
+    host = urlsplit(url).hostname or ""
+    return UPSTREAMS.get(host, host)
+
+
+def _session_for(host: str) -> requests.Session:
+    """One keep-alive session (and connection pool) per upstream host."""
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _count(upstream: str, key: str, n: int = 1):
+    with _stats_lock:
+        _stats[upstream][key] += n
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+def _route(url: str, kwargs: dict) -> str:
+    if not UPSTREAM_OVERRIDE:
+        return url
+    parts = urlsplit(url)
+    kwargs["headers"] = {**(kwargs.get("headers") or {}), "X-Upstream-Host": parts.hostname or ""}
+    return UPSTREAM_OVERRIDE + parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def _public(fields) -> list:
+    if isinstance(fields, dict):
+        fields = fields.items()
+    return sorted((str(k), str(v)) for k, v in (fields or ()) if k not in SECRET_FIELDS)
+
+
+def cassette_key(method: str, url: str, kwargs: dict) -> str:
+    """Stable hash of a request, ignoring API keys and credentials."""
+    parts = urlsplit(url)
+    request = {
+        "method": method.upper(),
+        "url": f"{parts.hostname}{parts.path}",
+        "params": _public(parse_qsl(parts.query) + _public(kwargs.get("params"))),
+        "data": _public(kwargs.get("data")),
+        "json": kwargs.get("json"),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def _cassette_path(method: str, url: str, kwargs: dict) -> str:
+    return os.path.join(CASSETTE_DIR, upstream_name(url), cassette_key(method, url, kwargs) + ".json")
+
+
+def _record(method: str, url: str, kwargs: dict, status: int, headers, body: bytes):
+    path = _cassette_path(method, url, kwargs)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    text = body.decode("utf-8", errors="replace")
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict) and SECRET_FIELDS & data.keys():
+            text = json.dumps({k: "REDACTED" if k in SECRET_FIELDS else v for k, v in data.items()})
+    except ValueError:
+        pass
+    entry = {
+        "method": method.upper(),
+        "url": url,
+        "status": status,
+        "headers": {"Content-Type": headers.get("Content-Type", "application/json")},
+        "body": text,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+
+
+def _replay(method: str, url: str, kwargs: dict) -> dict:
+    path = _cassette_path(method, url, kwargs)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        raise CassetteMiss(f"No recorded response for {method.upper()} {url} ({path})")
+    _count(upstream_name(url), "replayed")
+    return entry
+
+
+def _replayed_response(entry: dict) -> requests.Response:
+    res = requests.Response()
+    res.status_code = entry["status"]
+    res.headers.update(entry["headers"])
+    res._content = entry["body"].encode("utf-8")
+    res.url = entry["url"]
+    res.encoding = "utf-8"
+    return res
+
+
+def _areplayed_response(entry: dict) -> httpx.Response:
+    return httpx.Response(
+        entry["status"],
+        headers=entry["headers"],
+        content=entry["body"].encode("utf-8"),
+        request=httpx.Request(entry["method"], entry["url"]),
+    )
+
+
+def set_deadline(seconds: float = None):
+    """Bound every upstream call of the current request (and the tasks and threads it starts)."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Tighten the deadline to `seconds` from now inside the block; an earlier one still wins."""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> float:
+    """Seconds until the current deadline, or None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def _bounded_timeout(timeout, upstream: str):
+    """Shrink a (connect, read) timeout to what is left of the deadline."""
+    left = time_left()
+    if left is None:
+        return timeout
+    if left <= 0:
+        _count(upstream, "deadline_exceeded")
+        raise DeadlineExceeded(f"Time budget exhausted before calling {upstream}")
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return left if timeout is None else min(timeout, left)
+
+
+def _fits(delay: float) -> bool:
+    """Whether a retry after `delay` seconds could still finish before the deadline."""
+    left = time_left()
+    return left is None or delay < left
+
+
+def _wait_limit() -> float:
+    left = time_left()
+    return resilience.RATE_LIMIT_MAX_WAIT if left is None else min(resilience.RATE_LIMIT_MAX_WAIT, left)
+
+
+def _admit(upstream: str) -> bool:
+    """
+    Block until the provider's rate limiter and breaker let one call through.
+    Returns True for a half-open probe, which the caller must report or release.
+    """
+    try:
+        resilience.reject_if_open(upstream)
+        waited = 0.0
+        while wait := resilience.token_wait(upstream, waited, _wait_limit()):
+            _count(upstream, "rate_limit_waits")
+            time.sleep(wait)
+            waited += wait
+        # Last, so no rate-limit wait or error comes between taking the probe slot and the send
+        return resilience.check(upstream)
+    except resilience.UpstreamUnavailable:
+        _count(upstream, "skipped")
+        raise
+
+
+async def _aadmit(upstream: str) -> bool:
+    try:
+        resilience.reject_if_open(upstream)
+        waited = 0.0
+        while wait := await resilience.atoken_wait(upstream, waited, _wait_limit()):
+            _count(upstream, "rate_limit_waits")
+            await asyncio.sleep(wait)
+            waited += wait
+        return resilience.check(upstream)
+    except resilience.UpstreamUnavailable:
+        _count(upstream, "skipped")
+        raise
+
+
+def _backoff(attempt: int, retry_after=None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    # Full jitter: sleep a random amount up to the exponential cap
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def request(method: str, url: str, retries: int = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the pooled session for the URL's host.
+
+    Retries 429/5xx responses and connection errors with jittered exponential
+    backoff. The last response is returned as-is so callers keep checking
+    `status_code` themselves; the last exception is raised if every attempt failed.
+    Timeouts and retries never run past the deadline set for the current request.
+    Calls to a provider whose breaker is open, or that gets no rate-limit token in
+    time, raise `resilience.UpstreamUnavailable` without being sent.
+    """
+    if CASSETTE_MODE == "replay":
+        return _replayed_response(_replay(method, url, kwargs))
+
+    retries = MAX_RETRIES if retries is None else retries
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    upstream = upstream_name(url)
+    target = _route(url, kwargs)
+    session = _session_for(urlsplit(target).hostname or "")
+
+    timeout = kwargs.pop("timeout")
+    for attempt in range(retries + 1):
+        probe = _admit(upstream)
+        try:
+            kwargs["timeout"] = _bounded_timeout(timeout, upstream)
+            _count(upstream, "requests")
+            started = time.perf_counter()
+            try:
+                with telemetry.span(f"http.{upstream}", telemetry.upstream_seconds, upstream, method=method):
+                    res = session.request(method, target, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                _count(upstream, "timeouts" if isinstance(e, requests.Timeout) else "connection_errors")
+                resilience.report(upstream)
+                probe = False
+                delay = _backoff(attempt)
+                if attempt == retries or not _fits(delay):
+                    raise
+                _count(upstream, "retries")
+                time.sleep(delay)
+                continue
+            finally:
+                _count(upstream, "elapsed_ms", int((time.perf_counter() - started) * 1000))
+
+            _count(upstream, f"status_{res.status_code}")
+            resilience.report(upstream, res.status_code)
+            probe = False
+        finally:
+            if probe:
+                # Past the deadline before sending, or interrupted: the probe told us nothing
+                resilience.release(upstream)
+        delay = _backoff(attempt, res.headers.get("Retry-After"))
+        if res.status_code in RETRY_STATUSES and attempt < retries and _fits(delay):
+            _count(upstream, "retries")
+            time.sleep(delay)
+            continue
+        if res.status_code >= 400:
+            _count(upstream, "errors")
+        if CASSETTE_MODE == "record":
+            _record(method, url, kwargs, res.status_code, res.headers, res.content)
+        return res
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def _async_client() -> httpx.AsyncClient:
+    """One pooled AsyncClient per event loop, shared by every async tool."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=POOL_SIZE * 10, max_keepalive_connections=POOL_SIZE * 5)
+        client = httpx.AsyncClient(limits=limits)
+        _async_clients[loop] = client
+    return client
+
+
+def _httpx_timeout(timeout) -> httpx.Timeout:
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+async def arequest(method: str, url: str, retries: int = None, **kwargs) -> httpx.Response:
+    """Async counterpart of `request`, with the same retry policy and counters."""
+    if CASSETTE_MODE == "replay":
+        return _areplayed_response(_replay(method, url, kwargs))
+
+    retries = MAX_RETRIES if retries is None else retries
+    timeout = kwargs.pop("timeout", DEFAULT_TIMEOUT)
+    upstream = upstream_name(url)
+    target = _route(url, kwargs)
+    client = _async_client()
+
+    for attempt in range(retries + 1):
+        probe = await _aadmit(upstream)
+        try:
+            kwargs["timeout"] = _httpx_timeout(_bounded_timeout(timeout, upstream))
+            _count(upstream, "requests")
+            started = time.perf_counter()
+            try:
+                with telemetry.span(f"http.{upstream}", telemetry.upstream_seconds, upstream, method=method):
+                    res = await client.request(method, target, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                _count(upstream, "timeouts" if isinstance(e, httpx.TimeoutException) else "connection_errors")
+                resilience.report(upstream)
+                probe = False
+                delay = _backoff(attempt)
+                if attempt == retries or not _fits(delay):
+                    raise
+                _count(upstream, "retries")
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                _count(upstream, "elapsed_ms", int((time.perf_counter() - started) * 1000))
+
+            _count(upstream, f"status_{res.status_code}")
+            resilience.report(upstream, res.status_code)
+            probe = False
+        finally:
+            if probe:
+                # Cancelled by a deadline, or past it before sending: the probe told us nothing
+                resilience.release(upstream)
+        delay = _backoff(attempt, res.headers.get("Retry-After"))
+        if res.status_code in RETRY_STATUSES and attempt < retries and _fits(delay):
+            _count(upstream, "retries")
+            await asyncio.sleep(delay)
+            continue
+        if res.status_code >= 400:
+            _count(upstream, "errors")
+        if CASSETTE_MODE == "record":
+            _record(method, url, kwargs, res.status_code, res.headers, res.content)
+        return res
+
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url: str, **kwargs) -> httpx.Response:
+    return await arequest("POST", url, **kwargs)
+
+
+@asynccontextmanager
+async def astream(method: str, url: str, **kwargs):
+    """
+    Stream a response body (e.g. server-sent events). Not retried: the body may be
+    half-consumed. Streams are not recorded, but replay serves a recorded body whole.
+    """
+    if CASSETTE_MODE == "replay":
+        yield _areplayed_response(_replay(method, url, kwargs))
+        return
+
+    upstream = upstream_name(url)
+    probe = await _aadmit(upstream)
+    started = time.perf_counter()
+    try:
+        kwargs["timeout"] = _httpx_timeout(_bounded_timeout(kwargs.get("timeout", DEFAULT_TIMEOUT), upstream))
+        target = _route(url, kwargs)
+        _count(upstream, "requests")
+        with telemetry.span(f"http.{upstream}", telemetry.upstream_seconds, upstream, method=method, stream=True):
+            async with _async_client().stream(method, target, **kwargs) as res:
+                _count(upstream, f"status_{res.status_code}")
+                resilience.report(upstream, res.status_code)
+                probe = False
+                if res.status_code >= 400:
+                    _count(upstream, "errors")
+                yield res
+    except (httpx.TransportError, httpx.TimeoutException):
+        resilience.report(upstream)
+        probe = False
+        raise
+    finally:
+        if probe:
+            resilience.release(upstream)
+        _count(upstream, "elapsed_ms", int((time.perf_counter() - started) * 1000))
+
+
+async def aclose():
+    """Close the current loop's AsyncClient, e.g. on app shutdown."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def stats() -> dict:
+    """Snapshot of per-upstream counters (requests, retries, errors, status codes, elapsed_ms, replayed)."""
+    with _stats_lock:
+        return {upstream: dict(counters) for upstream, counters in _stats.items()}
@@ -0,0 +1,87 @@
+from datetime import date as date_cls, timedelta
+
+import routing
+
+# Longest trip planned day by day; longer requests are cut to this
+MAX_TRIP_DAYS = 14
+ATTRACTIONS_PER_DAY = 3
+
+
+def trip_dates(start: str, days: int) -> list:
+    """ISO dates of every day of the trip, or [] if `start` is malformed."""
+    try:
+        first = date_cls.fromisoformat(start)
+    except ValueError:
+        return []
+    return [(first + timedelta(days=d)).isoformat() for d in range(days)]
+
+
+def checkout_date(start: str, days: int) -> str:
+    """Hotel check-out for a `days`-day trip: the morning of the last day ("May 3-6" is three nights)."""
+    dates = trip_dates(start, max(days, 2))
+    return dates[-1] if dates else ""
+
+
+def located(record) -> bool:
+    return record is not None and record.lat is not None and record.lng is not None
+
+
+def plan_days(start: str, days: int, events: list, attractions: list, hotel=None,
+              attractions_per_day: int = ATTRACTIONS_PER_DAY) -> list:
+    """
+    Spread one trip's results over its days: [{"date", "events", "attractions", "distance_km"}].
+
+    Events go to the day they happen on. The best-rated attractions are grouped by
+    location into one cluster per day, and a cluster goes to the day whose events are
+    closest to it. Each day's attractions are listed in visiting order: from the hotel,
+    through the attractions, to the day's first event venue.
+    """
+    dates = trip_dates(start, days)
+    plan = [{"date": day, "events": [], "attractions": [], "distance_km": 0.0} for day in dates]
+    by_date = {day["date"]: day for day in plan}
+
+    for event in events:
+        day = by_date.get(event.date[:10])
+        if day is not None:
+            day["events"].append(event)
+
+    ranked = sorted(attractions, key=lambda a: (a.rating or 0, a.reviews or 0), reverse=True)
+    groups = cluster_groups(ranked[:len(plan) * attractions_per_day], len(plan), attractions_per_day)
+    for day, group in zip(assign_days(plan, groups), groups):
+        day["attractions"] = group
+
+    for day in plan:
+        stops = day["attractions"]
+        venue = next((e for e in day["events"] if located(e)), None)
+        order, km = routing.route([(a.lat, a.lng) for a in stops],
+                                  start=(hotel.lat, hotel.lng) if located(hotel) else None,
+                                  end=(venue.lat, venue.lng) if venue is not None else None)
+        day["attractions"] = [stops[i] for i in order]
+        day["distance_km"] = km
+    return plan
+
+
+def cluster_groups(chosen: list, days: int, attractions_per_day: int) -> list:
+    """`chosen` (best first) split by location into at most `days` groups, best group first."""
+    groups = {}
+    for attraction, label in zip(chosen, routing.cluster([(a.lat, a.lng) for a in chosen], days, attractions_per_day)):
+        groups.setdefault(label, []).append(attraction)
+    return list(groups.values())
+
+
+def assign_days(plan: list, groups: list) -> list:
+    """
+    The day each group goes to: days with located events pick the nearest remaining
+    group first, the other days take the rest, best group first.
+    """
+    centers = [(sum(a.lat for a in g) / len(g), sum(a.lng for a in g) / len(g)) for g in groups]
+    owners = [None] * len(groups)
+    for day in plan:
+        venues = [e for e in day["events"] if located(e)]
+        free = [i for i, owner in enumerate(owners) if owner is None]
+        if not venues or not free:
+            continue
+        gaps = [min(routing.haversine(c[0], c[1], v.lat, v.lng) for v in venues) for c in (centers[i] for i in free)]
+        owners[free[gaps.index(min(gaps))]] = day
+    rest = iter(day for day in plan if all(day is not owner for owner in owners))
+    return [owner if owner is not None else next(rest) for owner in owners]
@@ -0,0 +1,198 @@
+import re
+from datetime import date as date_cls, timedelta
+from typing import Optional
+import airports
+
+# Destination gazetteer (canonical city name -> IATA city code) from the offline airport index
+CITIES = airports.city_codes()
+ALIASES = airports.ALIASES
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "a": 1}
+
+DEFAULT_ORIGIN = ("Boston", "BOS")
+
+_names = sorted({n.lower() for n in CITIES} | set(ALIASES), key=len, reverse=True)
+_CITY_RE = re.compile(r"\b(" + "|".join(re.escape(n) for n in _names) + r")\b", re.IGNORECASE)
+_ORIGIN_CUE_RE = re.compile(r"\b(?:from|leaving|departing|out of|(?:i am|i'm|we are|we're|based|living|live) in)\s+$", re.IGNORECASE)
+_DEST_CUE_RE = re.compile(r"\b(?:to|visit|visiting)\s+$", re.IGNORECASE)
+_ROUTE_CUE_RE = re.compile(r"^\s*(?:area\s+|metro\s+)?(?:to|->|→|-)\s+", re.IGNORECASE)
+
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sept?|oct|nov|dec)[a-z]*\.?"
+_ISO_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_MONTH_DAY_RE = re.compile(_MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:\s*(?:-|–|to|through|until)\s*(?:" + _MONTH + r"\s+)?(\d{1,2})(?:st|nd|rd|th)?)?(?:,?\s+(\d{4}))?\b", re.IGNORECASE)
+_DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?" + _MONTH + r"(?:,?\s+(\d{4}))?", re.IGNORECASE)
+_SLASH_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?(?:\s*(?:-|–|to)\s*(\d{1,2})/(\d{1,2}))?\b")
+_RELATIVE_RE = re.compile(r"\b(today|tonight|day after tomorrow|tomorrow|(?:this |next )?weekend|next week)\b", re.IGNORECASE)
+_WEEKDAY_RE = re.compile(r"\b(?:(next|this)\s+)?(" + "|".join(WEEKDAYS) + r")\b", re.IGNORECASE)
+_IN_DAYS_RE = re.compile(r"\bin\s+(\d+|" + "|".join(NUMBERS) + r")\s+(day|week)s?\b", re.IGNORECASE)
+_LENGTH_RE = re.compile(r"(?<!in )\b(\d+|" + "|".join(NUMBERS) + r")[\s-]+(day|night|week)s?\b", re.IGNORECASE)
+# "± 2 days", "+/- 3 days", "plus or minus a day"; a bare "flexible dates" means ±2
+_FLEX_RE = re.compile(r"(?:±|\+/-|\+-|plus or minus)\s*(\d+|" + "|".join(NUMBERS) + r")\s*days?\b|\bflexible\b", re.IGNORECASE)
+DEFAULT_FLEX_DAYS = 2
+# Words that suggest a date we may have failed to parse
+_DATE_HINT_RE = re.compile(r"\b(\d{1,2}(st|nd|rd|th)|" + _MONTH + r"|week|weekend|holiday|christmas|easter)\b", re.IGNORECASE)
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else NUMBERS[token.lower()]
+
+
+def _month_day(month: int, day: int, year: Optional[int], today: date_cls) -> Optional[date_cls]:
+    """A month/day without a year means its next occurrence on or after today."""
+    try:
+        if year:
+            return date_cls(year, month, day)
+        candidate = date_cls(today.year, month, day)
+        if candidate < today:
+            candidate = date_cls(today.year + 1, month, day)
+        return candidate
+    except ValueError:
+        return None
+
+
+def _parse_dates(text: str, today: date_cls):
+    """Returns (start date, end date or None) for the first date expression found."""
+    m = _ISO_RE.search(text)
+    if m:
+        try:
+            return date_cls(int(m.group(1)), int(m.group(2)), int(m.group(3))), None
+        except ValueError:
+            pass
+
+    m = _MONTH_DAY_RE.search(text)
+    if m:
+        month = MONTHS[m.group(1).lower()]
+        end_month = MONTHS[m.group(3).lower()] if m.group(3) else month
+        year = int(m.group(5)) if m.group(5) else None
+        start = _month_day(month, int(m.group(2)), year, today)
+        end = _month_day(end_month, int(m.group(4)), start.year if start else year, today) if m.group(4) else None
+        if start:
+            return start, end
+
+    m = _DAY_MONTH_RE.search(text)
+    if m:
+        month = MONTHS[m.group(2).lower()]
+        start = _month_day(month, int(m.group(1)), int(m.group(3)) if m.group(3) else None, today)
+        if start:
+            return start, None
+
+    m = _SLASH_RE.search(text)
+    if m:
+        year = int(m.group(3)) if m.group(3) else None
+        if year and year < 100:
+            year += 2000
+        start = _month_day(int(m.group(1)), int(m.group(2)), year, today)
+        end = _month_day(int(m.group(4)), int(m.group(5)), start.year if start else year, today) if m.group(4) else None
+        if start:
+            return start, end
+
+    m = _RELATIVE_RE.search(text)
+    if m:
+        word = m.group(1).lower()
+        if word in ("today", "tonight"):
+            return today, None
+        if word == "tomorrow":
+            return today + timedelta(days=1), None
+        if word == "day after tomorrow":
+            return today + timedelta(days=2), None
+        if word == "next week":
+            return today + timedelta(days=7 - today.weekday()), None
+        # "weekend" on its own means the coming one
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if word == "next weekend":
+            saturday += timedelta(days=7)
+        return saturday, saturday + timedelta(days=1)
+
+    m = _WEEKDAY_RE.search(text)
+    if m:
+        ahead = (WEEKDAYS.index(m.group(2).lower()) - today.weekday()) % 7 or 7
+        if m.group(1) and m.group(1).lower() == "next" and ahead < 7:
+            ahead += 7
+        return today + timedelta(days=ahead), None
+
+    m = _IN_DAYS_RE.search(text)
+    if m:
+        n = _number(m.group(1))
+        return today + timedelta(days=n * (7 if m.group(2).lower() == "week" else 1)), None
+
+    return None, None
+
+
+def _trip_days(text: str, start, end) -> Optional[int]:
+    m = _LENGTH_RE.search(text)
+    if m:
+        n = _number(m.group(1))
+        unit = m.group(2).lower()
+        if unit == "week":
+            return n * 7
+        return n + 1 if unit == "night" else n
+    if start and end and end >= start:
+        return (end - start).days + 1
+    return None
+
+
+def extract(prompt: str, today: Optional[date_cls] = None) -> dict:
+    """
+    Pull destination, origin, start date and trip length out of a prompt without an LLM.
+
+    Returns the same keys as `main.extract_metadata` plus `days`, `flex_days` and `confidence`
+    (0-1); callers should fall back to the model when confidence is low.
+    """
+    today = today or date_cls.today()
+    text = " ".join(prompt.split())
+
+    origin = None
+    destinations, cued = [], []
+    for m in _CITY_RE.finditer(text):
+        origin_cue = _ORIGIN_CUE_RE.search(text[:m.start()])
+        dest_cue = _DEST_CUE_RE.search(text[:m.start()])
+        route_cue = _ROUTE_CUE_RE.match(text[m.end():])
+        # Lowercase "la" or "sf" is usually just a word ("la la land") unless a cue makes it a place
+        if len(m.group(1)) == 2 and not m.group(1).isupper() and not (origin_cue or dest_cue or route_cue):
+            continue
+        name = airports.canonical_city(m.group(1))
+        # "from Boston ...", "I'm in Boston" or "Boston to Chicago" name the departure city
+        if origin is None and (origin_cue or (not destinations and route_cue)):
+            origin = name
+        elif name != origin and name not in destinations:
+            destinations.append(name)
+            if dest_cue:
+                cued.append(name)
+    # "... want to visit Miami" beats a city mentioned in passing
+    city = (cued or destinations or [None])[0]
+
+    flex_days = 0
+    m = _FLEX_RE.search(text)
+    if m:
+        flex_days = _number(m.group(1)) if m.group(1) else DEFAULT_FLEX_DAYS
+        # Keep "± 2 days" from being read as the trip length
+        text = text[:m.start()] + text[m.end():]
+
+    start, end = _parse_dates(text, today)
+    origin_name, origin_code = (origin, CITIES[origin]) if origin else DEFAULT_ORIGIN
+
+    confidence = 0.0
+    if city:
+        confidence = 0.9 if start else 0.5
+        # A date-looking phrase we couldn't parse is a reason to ask the model
+        if not start and not _DATE_HINT_RE.search(text):
+            confidence = 0.85
+        # Several candidate destinations, or a trip to where the user already is: let the model decide
+        if len(destinations) > 1 or city == origin_name:
+            confidence = min(confidence, 0.5)
+
+    return {
+        "city": city or "",
+        "city_code": CITIES.get(city, "") if city else "",
+        "date": start.isoformat() if start else "",
+        "origin": origin_name,
+        "origin_code": origin_code,
+        "days": _trip_days(text, start, end),
+        "flex_days": flex_days,
+        "confidence": confidence,
+    }
@@ -1,22 +1,76 @@
+import asyncio
+import importlib
 import json
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import date as date_cls, timedelta
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 import os
-from dotenv import load_dotenv
-from smolagents import CodeAgent
 import AttractionSearchTool as ats
 import EventSearchTool as es
 import HotelSearchTool as hs
 import FlightSearchTool as fs
-import SummaryTool as st
-from model import OpenRouterModel
-from collector import collected_results
+from model import OpenRouterModel, CachedModel
+import collector
+import config
+import http_client
+import itinerary
+import local_extractor
+import records
+import resilience
+import telemetry
+import cache
+import warmer
 
-load_dotenv()
+# Fast plan: call all four tools in parallel from the extracted metadata instead of
+# letting the CodeAgent discover them step by step. The agent is only a fallback.
+FAST_PLAN = os.getenv("FAST_PLAN", "1") != "0"
+# Whole-request time budget in seconds; every upstream call is bounded by it
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "30"))
+# Part of the budget kept back for the summary call
+SUMMARY_RESERVE = float(os.getenv("SUMMARY_RESERVE", "5"))
+TOOL_DEADLINE = float(os.getenv("TOOL_DEADLINE", "25"))
+# Per-tool overrides, e.g. FLIGHTS_TOOL_DEADLINE=8
+TOOL_DEADLINES = {
+    section: float(os.getenv(f"{section.upper()}_TOOL_DEADLINE", TOOL_DEADLINE))
+    for section in collector.TOOL_SECTIONS
+}
+DEFAULT_ORIGIN = "BOS"
+# Prompts the rule-based extractor is at least this sure about skip the LLM call
+LOCAL_EXTRACT_CONFIDENCE = float(os.getenv("LOCAL_EXTRACT_CONFIDENCE", "0.8"))
+# Completion caps: the extraction is a short JSON object, the summary 3–4 sentences
+EXTRACT_MAX_TOKENS = 120
+SUMMARY_MAX_TOKENS = 300
+# Trip length /api/itinerary plans when the prompt doesn't give one
+DEFAULT_TRIP_DAYS = int(os.getenv("DEFAULT_TRIP_DAYS", "3"))
+# Trips of /api/agent/batch requests planned at once, across every batch this worker serves
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Most prompts one batch request may carry
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "100"))
+# Prompts per batched extraction call; longer batches are split into several calls run together
+EXTRACT_BATCH_SIZE = 25
+batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+# Import the agent fallback in the background once the app is up, so its first run doesn't wait on it
+AGENT_PRELOAD = os.getenv("AGENT_PRELOAD", "1") != "0"
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = [asyncio.create_task(warmer.run())] if warmer.WARM_CITIES else []
+    if AGENT_PRELOAD:
+        background.append(asyncio.create_task(load_agent()))
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    for task in background:
+        task.cancel()
+    await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -24,7 +78,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-model = OpenRouterModel(
+# Deterministic calls (temperature 0) are answered from the LLM cache when repeated
+model = CachedModel(OpenRouterModel(
     model="meta-llama/llama-3-70b-instruct",
     api_key=os.getenv("OPENROUTER_API_KEY"),
     system_prompt=(
@@ -36,116 +91,521 @@ model = OpenRouterModel(
         "Even if one tool may return nothing, still attempt to call it. "
         "When calling the flights tool, convert city names to IATA 3-letter codes. For example, Boston → BOS, New York → JFK. "
         "If you’re not sure, just use the city name—downstream logic will handle it. "
-        "The final output should be a JSON object containing a `summary` (natural language) and a `structured` field "
-        "with events, flights, hotels, and attractions as subfields. "
-        "If any are empty, return an empty list—do not omit any fields. "
+        "Once all four tools have run, just call final_answer with a one-line note; the results are collected automatically. "
         "**If the user does not specify a departure city, assume Boston (BOS).** "
         "**If the user does not specify a date, assume the departure date is tomorrow.** "
         "When calling the attractions tool, prioritize the city’s most famous landmarks (e.g., Statue of Liberty, Empire State Building); "
         "if needed, use keyword search."
     )
-)
+))
+
+async def load_agent():
+    """The `trip_agent` module, imported off the event loop the first time it is needed."""
+    module = sys.modules.get("trip_agent")
+    if module is None:
+        with telemetry.span("load_agent"):
+            module = await asyncio.to_thread(importlib.import_module, "trip_agent")
+    return module
 
-agent = CodeAgent(
-    tools=[
-        es.search_ticketmaster_events,
-        ats.get_popular_attractions,
-        fs.search_flight_amadeus,
-        hs.search_hotels_from_city,
-    ],
-    model=model,
-    add_base_tools=False
+EXTRACTION_FIELDS = (
+    "the travel destination city (city), date (date) and departure city (origin), "
+    "plus the IATA city code of the destination (city_code), the IATA airport code of the departure city (origin_code) "
+    "and the trip length in days (days, a number)"
+)
+EXTRACTION_EXAMPLE = (
+    "{\"city\": \"Chicago\", \"date\": \"2025-05-09\", \"origin\": \"Boston\", "
+    "\"city_code\": \"CHI\", \"origin_code\": \"BOS\", \"days\": 3}"
 )
 
-def extract_metadata(prompt: str) -> dict:
-    extraction_prompt = (
-        "Please extract the travel destination city (city) and date (date) from the user input below. "
-        "Return it as a JSON object, e.g., {\"city\": \"Chicago\", \"date\": \"2025-05-09\"}. "
-        "If either is unrecognizable, return an empty string for that field.\n\n"
+def extraction_prompt(prompt: str, today: date_cls = None) -> str:
+    return (
+        f"Today is {(today or date_cls.today()).isoformat()}. "
+        f"Please extract {EXTRACTION_FIELDS} from the user input below. "
+        f"Return only a JSON object, e.g., {EXTRACTION_EXAMPLE}. "
+        "If any field is unrecognizable, return an empty string for that field.\n\n"
         f"User input: {prompt}"
     )
-    response = model(extraction_prompt).content
+
+def batch_extraction_prompt(prompts: list, today: date_cls = None) -> str:
+    numbered = "\n".join(f"{i + 1}. {' '.join(prompt.split())}" for i, prompt in enumerate(prompts))
+    return (
+        f"Today is {(today or date_cls.today()).isoformat()}. "
+        f"For each numbered user input below, extract {EXTRACTION_FIELDS}. "
+        f"Return only a JSON array with one object per input, in the same order, e.g., [{EXTRACTION_EXAMPLE}]. "
+        "If any field is unrecognizable, return an empty string for that field.\n\n"
+        f"User inputs:\n{numbered}"
+    )
+
+def parse_metadata(response: str) -> dict:
     try:
-        return json.loads(response)
+        metadata = json.loads(response)
+        if isinstance(metadata, dict):
+            return metadata
     except Exception:
-        return {"city": "", "date": ""}
+        pass
+    return {"city": "", "date": ""}
 
-class PromptRequest(BaseModel):
-    prompt: str
+def parse_batch_metadata(response: str, count: int) -> list:
+    """One metadata dict per input; all blank if the answer isn't a JSON array of `count` objects."""
+    try:
+        items = json.loads(response)
+    except Exception:
+        items = None
+    if not isinstance(items, list) or len(items) != count:
+        return [{"city": "", "date": ""} for _ in range(count)]
+    return [item if isinstance(item, dict) else {"city": "", "date": ""} for item in items]
 
-@app.post("/api/agent")
-def run_agent(req: PromptRequest):
+def merge_metadata(llm: dict, local: dict) -> dict:
+    """LLM answer, with anything it left blank taken from the local extractor."""
+    return {**local, **{k: v for k, v in llm.items() if v}}
+
+def llm_extract_metadata(prompt: str, today: date_cls = None) -> dict:
+    # The extraction prompt is self-contained; the agent's system prompt would only add tokens
+    response = model(extraction_prompt(prompt, today), temperature=0, use_system_prompt=False, max_tokens=EXTRACT_MAX_TOKENS)
+    return parse_metadata(response.content)
+
+@telemetry.traced("extract_metadata")
+def extract_metadata(prompt: str, today: date_cls = None) -> dict:
+    local = local_extractor.extract(prompt, today)
+    if local["confidence"] >= LOCAL_EXTRACT_CONFIDENCE:
+        return local
+    return merge_metadata(llm_extract_metadata(prompt, today), local)
+
+@telemetry.traced("extract_metadata")
+async def aextract_metadata(prompt: str) -> dict:
+    local = local_extractor.extract(prompt)
+    if local["confidence"] >= LOCAL_EXTRACT_CONFIDENCE:
+        return local
+    response = await model.acall(extraction_prompt(prompt), temperature=0, use_system_prompt=False, max_tokens=EXTRACT_MAX_TOKENS)
+    llm = parse_metadata(response.content)
+    return merge_metadata(llm, local)
+
+@telemetry.traced("extract_metadata_batch")
+async def aextract_batch(prompts: list) -> list:
+    """
+    Metadata for every prompt: the local extractor where it is sure, and one LLM
+    call per `EXTRACT_BATCH_SIZE` of the rest instead of one call per prompt.
+    """
+    metadata = [local_extractor.extract(prompt) for prompt in prompts]
+    unsure = [i for i, local in enumerate(metadata) if local["confidence"] < LOCAL_EXTRACT_CONFIDENCE]
+    chunks = [unsure[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(unsure), EXTRACT_BATCH_SIZE)]
+
+    async def extract(chunk):
+        response = await model.acall(batch_extraction_prompt([prompts[i] for i in chunk]), temperature=0,
+                                     use_system_prompt=False, max_tokens=EXTRACT_MAX_TOKENS * len(chunk))
+        for i, llm in zip(chunk, parse_batch_metadata(response.content, len(chunk))):
+            metadata[i] = merge_metadata(llm, metadata[i])
+
+    await asyncio.gather(*(extract(chunk) for chunk in chunks))
+    return metadata
+
+def resolve_plan(metadata: dict) -> dict:
+    """Tool arguments from extracted metadata, filling in the system prompt's defaults."""
+    city = metadata["city"]
+    date = metadata.get("date") or (date_cls.today() + timedelta(days=1)).isoformat()
     try:
-        for k in collected_results:
-            collected_results[k] = []
+        days = min(max(int(metadata.get("days") or 1), 1), itinerary.MAX_TRIP_DAYS)
+    except (TypeError, ValueError):
+        days = 1
+    return {
+        "city": city,
+        "date": date,
+        "origin": metadata.get("origin_code") or DEFAULT_ORIGIN,
+        "city_code": metadata.get("city_code") or city,
+        "flex_days": int(metadata.get("flex_days") or 0),
+        "days": days,
+        "checkout": itinerary.checkout_date(date, days) if days > 1 else "",
+    }
 
-        # ✅ Step 1: Extract metadata from user input
-        metadata = extract_metadata(req.prompt)
-        collected_results["metadata"] = {
-            "destination": metadata.get("city", "unknown"),
-            "date": metadata.get("date", "unknown")
-        }
+def tool_budget(section: str = None) -> float:
+    """Seconds a tool may run: its own deadline, cut short so the summary still fits in the request budget."""
+    deadline = TOOL_DEADLINES.get(section, TOOL_DEADLINE)
+    left = http_client.time_left()
+    return deadline if left is None else max(min(deadline, left - SUMMARY_RESERVE), 0)
 
-        # ✅ Step 2: Run agent and collect tool outputs
-        _ = agent.run(req.prompt)
+async def bounded(section: str, coro):
+    """Run one tool under its deadline; a tool that fails or runs late leaves its section empty."""
+    seconds = tool_budget(section)
+    with http_client.deadline(seconds):
+        # Its own task, so a CancelledError raised inside the tool isn't mistaken for this
+        # call being cancelled: asyncio.wait only raises it for the latter
+        task = asyncio.ensure_future(coro)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=seconds)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        try:
+            if not done:
+                task.cancel()
+                await asyncio.wait({task})
+                raise asyncio.TimeoutError
+            task.result()
+            # Tools swallow upstream errors, including the deadline, and return what they have
+            if http_client.time_left() <= 0 and collector.status(section) != "ok":
+                raise asyncio.TimeoutError
+        except asyncio.TimeoutError:
+            collector.mark(section, "timeout")
+            print(f"⏱️ {section} tool missed its {seconds:.1f}s deadline")
+        except asyncio.CancelledError:
+            collector.mark(section, "error")
+            print(f"🔥 {section} tool was cancelled")
+        except Exception as e:
+            collector.mark(section, "error")
+            print(f"🔥 {section} tool failed:", str(e))
 
-        # ✅ Step 3: Summarize response
+def start_fast_plan(plan: dict) -> dict:
+    """Schedule the four async tools, each under its deadline; returns {task: section name}."""
+    if plan["flex_days"]:
+        flights = fs.async_search_flexible_flights(plan["origin"], plan["city_code"], plan["date"], plan["flex_days"])
+    else:
+        flights = fs.async_search_flight_amadeus(plan["origin"], plan["city_code"], plan["date"])
+    calls = {
+        # A multi-day trip fetches every day's events in one query and prices the whole stay
+        "events": es.async_search_ticketmaster_events(plan["city"], plan["date"], days=plan["days"]),
+        "attractions": ats.async_get_popular_attractions(plan["city"]),
+        "flights": flights,
+        "hotels": hs.async_search_hotels_from_city(plan["city_code"], plan["date"], plan["checkout"]),
+    }
+    return {asyncio.ensure_future(bounded(name, coro)): name for name, coro in calls.items()}
 
-        destination = collected_results["metadata"]["destination"]
-        date = collected_results["metadata"]["date"]
+async def run_fast_plan(metadata: dict) -> dict:
+    """
+    Run the four search tools concurrently from extracted metadata.
+
+    Each tool gets its `TOOL_DEADLINES` entry, less whatever the request budget no
+    longer allows; a tool still running after that is cancelled and leaves its
+    section empty. Returns the resolved tool arguments.
+    """
+    plan = resolve_plan(metadata)
+    await asyncio.gather(*start_fast_plan(plan))
+    add_days(plan, collector.current_results())
+    return plan
+
+def add_days(plan: dict, collected: dict):
+    """Lay the trip's events and attractions out day by day, each day routed from the first hotel."""
+    if plan["days"] > 1:
+        collected["metadata"]["end_date"] = itinerary.trip_dates(plan["date"], plan["days"])[-1]
+    hotel = collected["hotels"][0] if collected["hotels"] else None
+    with telemetry.span("plan_days"):
+        collected["days"] = itinerary.plan_days(plan["date"], plan["days"], collected["events"], collected["attractions"], hotel)
+
+async def run_agent_plan(prompt: str):
+    """Agent fallback, given the same share of the budget as a single tool."""
+    # The agent and its tools are synchronous; keep them off the event loop. A late
+    # agent thread cannot be cancelled, but its upstream calls fail once the budget is spent.
+    trip_agent = await load_agent()
+    seconds = tool_budget()
+    budget = trip_agent.StepBudget()
+    try:
+        with telemetry.span("agent_run"):
+            await asyncio.wait_for(asyncio.to_thread(trip_agent.build_agent(model, budget).run, prompt), seconds)
+        return "skipped"
+    except asyncio.TimeoutError:
+        print(f"⏱️ Agent missed its {seconds:.1f}s deadline")
+        return "timeout"
+    except trip_agent.AgentError as e:
+        # Raised by agent.interrupt() once the token budget is spent
+        print("🧮 Agent stopped:", str(e))
+        return "skipped"
+    finally:
+        print("🧮 Agent tokens:", budget.format())
+
+def summarize_collected(collected, max_items=2):
+    def flight_summary(f):
+        return f"{f.airline} · {f.origin}→{f.destination} · {f.departure_time} → {f.arrival_time} · ${f.price}"
 
-        def summarize_collected(collected, max_items=2):
-            def flight_summary(f):
-                return f"{f.get('airline', 'Unknown')} · {f.get('from')}→{f.get('to')} · " \
-                       f"{f.get('departure_time', '')} → {f.get('arrival_time', '')} · ${f.get('price', '?')}"
+    def hotel_summary(h):
+        price = f" · {h.price} {h.currency or ''}".rstrip() if h.price is not None else ""
+        return f"{h.name} · {h.address or ''}{price}"
 
-            def hotel_summary(h):
-                return f"{h.get('name', 'Unnamed')} · {h.get('address', '')}"
+    def event_summary(e):
+        return f"{e.name} · {e.date} @ {e.venue}"
 
-            def event_summary(e):
-                return f"{e.get('name', 'Unknown')} · {e.get('date', '')} @ {e.get('venue', '')}"
+    def attraction_summary(a):
+        return f"{a.name} (⭐ {a.rating} · {a.reviews} reviews)"
 
-            def attraction_summary(a):
-                return f"{a.get('name', 'Unnamed')} (⭐ {a.get('rating', '?')} · {a.get('reviews', '?')} reviews)"
+    return {
+        "metadata": collected.get("metadata", {}),
+        "flights": [flight_summary(f) for f in collected.get("flights", [])[:max_items]],
+        "hotels": [hotel_summary(h) for h in collected.get("hotels", [])[:max_items]],
+        "events": [event_summary(e) for e in collected.get("events", [])[:max_items]],
+        "attractions": [attraction_summary(a) for a in collected.get("attractions", [])[:max_items]],
+    }
 
-            return {
-                "metadata": collected.get("metadata", {}),
-                "flights": [flight_summary(f) for f in collected.get("flights", [])[:max_items]],
-                "hotels": [hotel_summary(h) for h in collected.get("hotels", [])[:max_items]],
-                "events": [event_summary(e) for e in collected.get("events", [])[:max_items]],
-                "attractions": [attraction_summary(a) for a in collected.get("attractions", [])[:max_items]],
-            }
+def day_summaries(collected) -> list:
+    """One line per trip day, places in visiting order, e.g. "2025-05-02: Art Institute, Millennium Park; Cubs vs. Mets @ Wrigley Field" """
+    lines = []
+    for day in collected.get("days", []):
+        sights = ", ".join(a.name for a in day["attractions"])
+        events = ", ".join(f"{e.name} @ {e.venue}" for e in day["events"][:2])
+        lines.append(f"{day['date']}: " + ("; ".join(part for part in (sights, events) if part) or "free day"))
+    return lines
 
-        def run_summary(collected, date, destination):
-            compressed = summarize_collected(collected)
+def summary_messages(collected, date, destination) -> list:
+    compressed = summarize_collected(collected)
 
-            content_lines = []
-            for key in ["flights", "hotels", "attractions", "events"]:
-                items = compressed.get(key, [])
-                if items:
-                    content_lines.append(f"{key.title()}:\n" + "\n".join(f"- {i}" for i in items))
+    content_lines = []
+    for key in ["flights", "hotels", "attractions", "events"]:
+        items = compressed.get(key, [])
+        if items:
+            content_lines.append(f"{key.title()}:\n" + "\n".join(f"- {i}" for i in items))
+    days = day_summaries(collected)
+    if days:
+        content_lines.append("Days:\n" + "\n".join(f"- {d}" for d in days))
 
-            compact_text = "\n\n".join(content_lines)
+    compact_text = "\n\n".join(content_lines)
+    end_date = collected.get("metadata", {}).get("end_date")
+    when = f"from {date} to {end_date}" if end_date else f"on {date}"
+    length = "a short day-by-day itinerary, one or two sentences per day" if len(days) > 1 else "a 3–4 sentence natural language itinerary"
+    order = " Each day's places are already in visiting order; keep that order." if days else ""
 
-            messages = [
-                {"role": "system", "content": "You are a travel assistant. Based on the data below, generate a 3–4 sentence natural language itinerary."},
-                {"role": "user", "content": f"""The user is planning to travel to {destination} on {date}.
+    return [
+        {"role": "system", "content": f"You are a travel assistant. Based on the data below, generate {length}.{order}"},
+        {"role": "user", "content": f"""The user is planning to travel to {destination} {when}.
 
 Here’s a summary of the available travel data:
 {compact_text}
 
 Please write a fun, natural itinerary suggestion. No JSON required.
 """}
-            ]
+    ]
 
-            return model(messages, use_system_prompt=False).content
+def fallback_summary(collected, date, destination) -> str:
+    """Plain itinerary used when the summary call fails or the budget runs out."""
+    compressed = summarize_collected(collected, max_items=1)
+    picks = [item for key in ("flights", "hotels", "attractions", "events") for item in compressed[key]]
+    days = day_summaries(collected)
+    if len(days) > 1:
+        return f"Your trip to {destination}: " + " · ".join(days)
+    return f"Your trip to {destination} on {date}" + (": " + "; ".join(picks) + "." if picks else ".")
 
-        summary = run_summary(collected_results, date, destination)
+def summary_max_tokens(collected) -> int:
+    # Multi-day itineraries get room for a sentence or two per extra day
+    return SUMMARY_MAX_TOKENS + 60 * max(len(collected.get("days", [])) - 1, 0)
 
-        return {
-            "result": summary,
-            "structured": collected_results
-        }
+async def write_summary(collected) -> str:
+    destination = collected["metadata"]["destination"]
+    date = collected["metadata"]["date"]
+    with telemetry.span("summary"):
+        messages = summary_messages(collected, date, destination)
+        summary = (await model.acall(messages, use_system_prompt=False, max_tokens=summary_max_tokens(collected))).content
+    if summary.startswith(("[Error]", "[Exception]")):
+        print("🔥 Summary failed:", summary)
+        collector.mark("summary", "error")
+        return fallback_summary(collected, date, destination)
+    return summary
+
+class PromptRequest(BaseModel):
+    prompt: str
+
+class BatchRequest(BaseModel):
+    prompts: list[str]
+
+class RecordResponse(Response):
+    """JSON response rendered with `records.dumps`, skipping FastAPI's generic encoder."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return records.dumps(content)
 
+@app.post("/api/agent")
+async def run_agent(req: PromptRequest):
+    return await plan_trip(req.prompt)
+
+@app.post("/api/itinerary")
+async def run_itinerary(req: PromptRequest):
+    """Day-by-day plan: like /api/agent, but a trip without a stated length spans `DEFAULT_TRIP_DAYS`."""
+    return await plan_trip(req.prompt, default_days=DEFAULT_TRIP_DAYS)
+
+async def plan_trip(prompt: str, default_days: int = 1):
+    try:
+        return RecordResponse(await trip_result(prompt, default_days))
     except Exception as e:
         return {"error": str(e)}
+
+async def trip_result(prompt: str, default_days: int = 1, metadata: dict = None) -> dict:
+    """Plan one trip; batches pass the `metadata` they already extracted."""
+    collected_results = collector.new_results()
+    spans = telemetry.start_trace()
+    http_client.set_deadline(REQUEST_BUDGET)
+
+    # ✅ Step 1: Extract metadata from user input
+    if metadata is None:
+        metadata = await aextract_metadata(prompt)
+    metadata["days"] = metadata.get("days") or default_days
+    collected_results["metadata"] = {
+        "destination": metadata.get("city", "unknown"),
+        "date": metadata.get("date", "unknown")
+    }
+
+    # ✅ Step 2: Run all tools in parallel, falling back to the agent if extraction failed
+    missing = "skipped"
+    if FAST_PLAN and metadata.get("city"):
+        plan = await run_fast_plan(metadata)
+        collected_results["metadata"]["date"] = plan["date"]
+    else:
+        missing = await run_agent_plan(prompt)
+
+    # ✅ Step 3: Summarize response
+    summary = await write_summary(collected_results)
+    status, partial = collector.status_report(missing)
+    print("⏱️ Trip timings:", telemetry.format_trace(spans))
+
+    return {
+        "result": summary,
+        # Copy so a tool finishing after its deadline cannot change the response
+        "structured": dict(collected_results),
+        "partial": partial,
+        "status": status,
+    }
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {records.dumps(data).decode()}\n\n"
+
+async def stream_plan(prompt: str):
+    """
+    Server-sent events for one trip: `metadata`, then one event per section as its
+    tool finishes, then `summary` token deltas, the per-section `status` and a final `done`.
+    """
+    try:
+        collected_results = collector.new_results()
+        spans = telemetry.start_trace()
+        http_client.set_deadline(REQUEST_BUDGET)
+        metadata = await aextract_metadata(prompt)
+        collected_results["metadata"] = {
+            "destination": metadata.get("city", "unknown"),
+            "date": metadata.get("date", "unknown")
+        }
+
+        if FAST_PLAN and metadata.get("city"):
+            plan = resolve_plan(metadata)
+            collected_results["metadata"]["date"] = plan["date"]
+            yield sse("metadata", collected_results["metadata"])
+
+            # Tools enforce their own deadlines, so every task finishes in time
+            tasks = start_fast_plan(plan)
+            pending = set(tasks)
+            missing = "skipped"
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield sse(tasks[task], collected_results[tasks[task]])
+                        if tasks[task] == "flights" and collected_results["flight_calendar"]:
+                            yield sse("flight_calendar", collected_results["flight_calendar"])
+            finally:
+                # Reached early when the client disconnects mid-stream
+                for task in pending:
+                    task.cancel()
+            add_days(plan, collected_results)
+            if collected_results["days"]:
+                yield sse("days", collected_results["days"])
+        else:
+            yield sse("metadata", collected_results["metadata"])
+            missing = await run_agent_plan(prompt)
+            for section in collector.SECTIONS:
+                yield sse(section, collected_results[section])
+
+        destination = collected_results["metadata"]["destination"]
+        date = collected_results["metadata"]["date"]
+        messages = summary_messages(collected_results, date, destination)
+        with telemetry.span("summary"):
+            async for delta in model.astream(messages, use_system_prompt=False, max_tokens=summary_max_tokens(collected_results)):
+                if delta.startswith(("[Error]", "[Exception]")):
+                    print("🔥 Summary failed:", delta)
+                    collector.mark("summary", "error")
+                    delta = fallback_summary(collected_results, date, destination)
+                yield sse("summary", {"delta": delta})
+        print("⏱️ Trip timings:", telemetry.format_trace(spans))
+
+        status, partial = collector.status_report(missing)
+        yield sse("status", {"partial": partial, "sections": status})
+        yield sse("done", {})
+
+    except Exception as e:
+        yield sse("error", {"error": str(e)})
+
+def trip_key(prompt: str, metadata: dict) -> tuple:
+    """Prompts that resolve to the same tool calls share one plan; agent fallbacks match on the prompt."""
+    if FAST_PLAN and metadata.get("city"):
+        return tuple(sorted(resolve_plan({**metadata, "days": metadata.get("days") or 1}).items()))
+    return ("prompt", cache.normalize_key(prompt))
+
+async def plan_batch(prompts: list):
+    """
+    JSON lines, one per prompt in the order trips finish, each tagged with its `index`.
+
+    Metadata is extracted for the whole batch at once; prompts asking for the same
+    trip are planned once, and tool calls shared between different trips (e.g. the
+    same city's hotels) are coalesced by the result cache.
+    """
+    started = time.perf_counter()
+    metadata = await aextract_batch(prompts)
+    groups = {}
+    for index, (prompt, found) in enumerate(zip(prompts, metadata)):
+        groups.setdefault(trip_key(prompt, found), []).append(index)
+
+    async def plan(indexes):
+        async with batch_slots:
+            return await trip_result(prompts[indexes[0]], metadata=metadata[indexes[0]])
+
+    tasks = {asyncio.create_task(plan(indexes)): indexes for indexes in groups.values()}
+    print(f"📦 Batch of {len(prompts)} prompts: {len(tasks)} distinct trips")
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # exception() raises for a task cancelled from inside, e.g. by a shared computation
+                if task.cancelled():
+                    result = {"error": "Trip planning was cancelled"}
+                elif task.exception() is not None:
+                    result = {"error": str(task.exception())}
+                else:
+                    result = task.result()
+                yield b"".join(records.dumps({"index": i, **result}) + b"\n" for i in tasks[task])
+    finally:
+        # Reached early when the client disconnects mid-stream
+        for task in pending:
+            task.cancel()
+    print(f"📦 Batch of {len(prompts)} prompts done in {time.perf_counter() - started:.1f}s")
+
+@app.post("/api/agent/batch")
+async def run_agent_batch(req: BatchRequest):
+    if len(req.prompts) > BATCH_MAX_PROMPTS:
+        return {"error": f"At most {BATCH_MAX_PROMPTS} prompts per batch"}
+    return StreamingResponse(plan_batch(req.prompts), media_type="application/x-ndjson")
+
+@app.post("/api/agent/stream")
+async def run_agent_stream(req: PromptRequest):
+    return StreamingResponse(
+        stream_plan(req.prompt),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/healthz")
+def healthz():
+    """Readiness probe: 503 until startup has finished and again while shutting down."""
+    ready = getattr(app.state, "ready", False)
+    body = {
+        "status": "ok" if ready else "unavailable",
+        "agent_loaded": "trip_agent" in sys.modules,
+        # Informational only: a failing provider degrades answers but doesn't make the worker unready
+        "open_circuits": sorted(name for name, guard in resilience.stats().items() if guard["state"] == "open"),
+    }
+    return body if ready else JSONResponse(body, status_code=503)
+
+@app.get("/api/upstreams")
+def upstreams():
+    """Circuit breaker state and current rate limit per provider, for this worker."""
+    return resilience.stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint; each worker process reports its own metrics."""
+    return PlainTextResponse(
+        telemetry.render(http_client.stats(), cache.stats(), model.stats(), resilience.stats()),
+        media_type="text/plain; version=0.0.4",
+    )
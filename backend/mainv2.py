@@ -1,20 +1,19 @@
 import json
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 import os
-from dotenv import load_dotenv
-from smolagents import CodeAgent
+from smolagents import CodeAgent, tool
 import AttractionSearchTool as ats
 import EventSearchTool as es
 import HotelSearchTool as hs
 import FlightSearchTool as fs
 import SummaryTool as st
 from model import OpenRouterModel
-from collector import collected_results
-
-load_dotenv()
+import collector
+import config
+import records
 
 app = FastAPI()
 app.add_middleware(
@@ -46,7 +45,7 @@ model = OpenRouterModel(
 )
 
 agent = CodeAgent(
-    tools=[es.search_ticketmaster_events, ats.get_popular_attractions, fs.search_flight_amadeus, hs.search_hotels_from_city],
+    tools=[tool(fn) for fn in (es.search_ticketmaster_events, ats.get_popular_attractions, fs.search_flight_amadeus, hs.search_hotels_from_city)],
     model=model,
     add_base_tools=False
 
@@ -71,8 +70,7 @@ class PromptRequest(BaseModel):
 @app.post("/api/agent")
 def run_agent(req: PromptRequest):
     try:
-        for k in collected_results:
-            collected_results[k] = []
+        collected_results = collector.new_results()
 
         # ✅ Step 1: 从用户输入中提取地点和日期
         metadata = extract_metadata(req.prompt)
@@ -135,10 +133,11 @@ def run_agent(req: PromptRequest):
             return model(messages, use_system_prompt=False).content
         summary = run_summary(collected_results, date, destination)
         # print(summary)
-        return {
+        # records.dumps sends records under their API keys ("from"/"to"), not their attribute names
+        return Response(records.dumps({
             "result": summary,
             "structured": collected_results
-        }
+        }), media_type="application/json")
 
     except Exception as e:
         return {"error": str(e)}
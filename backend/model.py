@@ -1,28 +1,47 @@
+import hashlib
+import json
 import os
-import requests
+import config
+import http_client
+import telemetry
 from typing import Optional
+from cache import ResultCache, MemoryBackend
+
+# Completions routinely take longer than a plain API lookup
+LLM_TIMEOUT = (3.05, float(os.getenv("LLM_READ_TIMEOUT", "60")))
+# Completion cap for calls that don't pass their own max_tokens
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "500"))
+
+# USD per million (prompt, completion) tokens, used to report cache savings
+MODEL_PRICES = {
+    "meta-llama/llama-3-70b-instruct": (0.51, 0.74),
+}
 
 class ChatMessage:
-    def __init__(self, role: str, content: str):
+    def __init__(self, role: str, content: str, usage: Optional[dict] = None, cached: bool = False):
         self.role = role
         self.content = content
+        self.usage = usage or {}
+        # Answered from the LLM cache: `usage` describes the original call, nothing was spent
+        self.cached = cached
 
 class OpenRouterModel:
-    def __init__(self, model, api_key, system_prompt: Optional[str] = None):
+    def __init__(self, model, api_key, system_prompt: Optional[str] = None, max_tokens: int = LLM_MAX_TOKENS):
         self.model = model
         self.api_key = api_key
         self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
         self.base_url = "https://openrouter.ai/api/v1"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
-    def __call__(self, messages, **kwargs):
+    def build_payload(self, messages, use_system_prompt: bool = True, stop_sequences=None, **kwargs) -> dict:
         formatted_messages = []
 
         # Add system prompt as first message if provided
-        if self.system_prompt:
+        if self.system_prompt and use_system_prompt:
             formatted_messages.append({"role": "system", "content": self.system_prompt})
 
         for msg in messages:
@@ -38,25 +57,190 @@ class OpenRouterModel:
             "model": self.model,
             "messages": formatted_messages,
             "temperature": 0.7,
-            "max_tokens": 500,
+            "max_tokens": self.max_tokens,
             **kwargs
         }
+        # smolagents passes stop_sequences (e.g. "<end_code>"); OpenRouter calls them "stop"
+        if stop_sequences:
+            payload["stop"] = list(stop_sequences)
+        return payload
+
+    @staticmethod
+    def parse_response(res_json: dict) -> ChatMessage:
+        if "choices" in res_json:
+            content = res_json["choices"][0]["message"]["content"]
+            return ChatMessage(role="assistant", content=content, usage=res_json.get("usage"))
+        else:
+            error_msg = res_json.get("error", {}).get("message", "Unknown model error.")
+            return ChatMessage(role="assistant", content=f"[Error] {error_msg}")
+
+    def __call__(self, messages, **kwargs):
+        # A bare prompt string is a single user message
+        if isinstance(messages, str):
+            messages = [messages]
+        payload = self.build_payload(messages, **kwargs)
 
         try:
-            response = requests.post(
+            response = http_client.post(
                 f"{self.base_url}/chat/completions",
                 headers=self.headers,
-                json=payload
+                json=payload,
+                timeout=LLM_TIMEOUT
             )
             response.raise_for_status()
-            res_json = response.json()
+            message = self.parse_response(response.json())
+            telemetry.record_tokens(self.model, message.usage)
+            return message
+
+        except Exception as e:
+            return ChatMessage(role="assistant", content=f"[Exception] {str(e)}")
+
+    async def acall(self, messages, **kwargs):
+        """Async variant of `__call__` on the shared async HTTP client."""
+        if isinstance(messages, str):
+            messages = [messages]
+        payload = self.build_payload(messages, **kwargs)
 
-            if "choices" in res_json:
-                content = res_json["choices"][0]["message"]["content"]
-                return ChatMessage(role="assistant", content=content)
-            else:
-                error_msg = res_json.get("error", {}).get("message", "Unknown model error.")
-                return ChatMessage(role="assistant", content=f"[Error] {error_msg}")
+        try:
+            response = await http_client.apost(
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=LLM_TIMEOUT
+            )
+            response.raise_for_status()
+            message = self.parse_response(response.json())
+            telemetry.record_tokens(self.model, message.usage)
+            return message
 
         except Exception as e:
             return ChatMessage(role="assistant", content=f"[Exception] {str(e)}")
+
+    async def astream(self, messages, **kwargs):
+        """Yield the completion text piece by piece as OpenRouter streams it."""
+        if isinstance(messages, str):
+            messages = [messages]
+        # include_usage adds a last chunk with the token counts (and no choices)
+        payload = self.build_payload(messages, stream=True, stream_options={"include_usage": True}, **kwargs)
+
+        try:
+            async with http_client.astream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers=self.headers,
+                json=payload,
+                timeout=LLM_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # SSE frames look like "data: {...}"; comments and keep-alives are skipped
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        yield f"[Error] {chunk['error'].get('message', 'Unknown model error.')}"
+                        break
+                    if chunk.get("usage"):
+                        telemetry.record_tokens(self.model, chunk["usage"])
+                    delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+
+        except Exception as e:
+            yield f"[Exception] {str(e)}"
+
+
+class LLMResultCache(ResultCache):
+    @staticmethod
+    def cacheable(value) -> bool:
+        return bool(value) and not value["content"].startswith(("[Error]", "[Exception]"))
+
+
+class CachedModel:
+    """
+    Caching wrapper around `OpenRouterModel.__call__` / `acall`.
+
+    Calls are keyed on the model, the whitespace-normalized messages and the
+    sampling params. Sampled calls (temperature > 0) bypass the cache unless
+    `force_cache=True`; identical concurrent calls share one completion.
+    Anything else (system_prompt, astream, ...) is delegated to the wrapped model.
+    """
+
+    def __init__(self, model: OpenRouterModel, maxsize: int = 512, ttl: float = 3600):
+        self.wrapped = model
+        self.cache = LLMResultCache(MemoryBackend(maxsize, name="llm"), ttls={"llm": ttl})
+        self.bypassed = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+        self.saved_usd = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def cache_key(self, messages, **kwargs):
+        """Key for a call, or None when it must not be cached."""
+        force_cache = kwargs.pop("force_cache", False)
+        if isinstance(messages, str):
+            messages = [messages]
+        payload = self.wrapped.build_payload(messages, **kwargs)
+        if payload.get("temperature", 0) > 0 and not force_cache:
+            return None
+
+        for msg in payload["messages"]:
+            if isinstance(msg["content"], str):
+                msg["content"] = " ".join(msg["content"].split())
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def __call__(self, messages, force_cache: bool = False, **kwargs):
+        key = self.cache_key(messages, force_cache=force_cache, **kwargs)
+        if key is None:
+            self.bypassed += 1
+            return self.wrapped(messages, **kwargs)
+
+        fresh = []
+        def compute():
+            fresh.append(True)
+            msg = self.wrapped(messages, **kwargs)
+            return {"content": msg.content, "usage": msg.usage}
+
+        entry = self.cache.get_or_compute("llm", key, compute)
+        return self._message(entry, saved=not fresh)
+
+    async def acall(self, messages, force_cache: bool = False, **kwargs):
+        key = self.cache_key(messages, force_cache=force_cache, **kwargs)
+        if key is None:
+            self.bypassed += 1
+            return await self.wrapped.acall(messages, **kwargs)
+
+        fresh = []
+        async def compute():
+            fresh.append(True)
+            msg = await self.wrapped.acall(messages, **kwargs)
+            return {"content": msg.content, "usage": msg.usage}
+
+        entry = await self.cache.aget_or_compute("llm", key, compute)
+        return self._message(entry, saved=not fresh)
+
+    def _message(self, entry: dict, saved: bool) -> ChatMessage:
+        usage = entry["usage"] or {}
+        if saved:
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            prompt_price, completion_price = MODEL_PRICES.get(self.wrapped.model, (0.0, 0.0))
+            self.saved_prompt_tokens += prompt_tokens
+            self.saved_completion_tokens += completion_tokens
+            self.saved_usd += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        return ChatMessage(role="assistant", content=entry["content"], usage=usage, cached=saved)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "bypassed": self.bypassed,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+            "saved_usd": round(self.saved_usd, 6),
+        }
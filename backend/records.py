@@ -0,0 +1,171 @@
+from dataclasses import dataclass, fields
+from typing import ClassVar, Optional
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup; fall back to the stdlib encoder
+    orjson = None
+
+
+class Record:
+    """
+    Base for the typed tool results.
+
+    Records serialize under their API key names (`Flight.origin` is sent as
+    "from") and also answer `record["key"]` / `record.get("key")` so code written
+    against the old dict results, including agent-generated code, keeps working.
+    """
+
+    __slots__ = ()
+    KEYS: ClassVar[dict] = {}  # attribute -> API key, where they differ
+    ATTRS: ClassVar[dict] = {}  # API key -> attribute
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.ATTRS = {key: attr for attr, key in cls.KEYS.items()}
+
+    def to_dict(self) -> dict:
+        return {self.KEYS.get(f.name, f.name): getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**{cls.ATTRS.get(k, k): v for k, v in data.items() if k != "_type"})
+
+    def get(self, key: str, default=None):
+        return getattr(self, self.ATTRS.get(key, key), default)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+
+_MISSING = object()
+
+
+def _text(value, default: str = "") -> str:
+    return default if value is None else str(value)
+
+
+def _number(value) -> Optional[float]:
+    return None if value in (None, "") else float(value)
+
+
+@dataclass(slots=True)
+class Flight(Record):
+    KEYS: ClassVar[dict] = {"origin": "from", "destination": "to"}
+
+    airline: str
+    origin: str
+    destination: str
+    departure_time: str
+    arrival_time: str
+    price: float
+
+    def __post_init__(self):
+        if not self.origin or not self.destination or not self.departure_time:
+            raise ValueError(f"Incomplete flight: {self.origin}->{self.destination} at {self.departure_time!r}")
+        self.price = float(self.price)
+
+
+@dataclass(slots=True)
+class Hotel(Record):
+    name: str
+    image: Optional[str] = None
+    url: Optional[str] = None
+    address: Optional[str] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+
+    def __post_init__(self):
+        if not self.name:
+            raise ValueError("Hotel without a name")
+        self.price = _number(self.price)
+        self.lat, self.lng = _number(self.lat), _number(self.lng)
+
+
+@dataclass(slots=True)
+class Event(Record):
+    name: str
+    date: str
+    venue: str
+    url: str = "#"
+    image: str = ""
+    lat: Optional[float] = None  # venue location, when Ticketmaster has one
+    lng: Optional[float] = None
+
+    def __post_init__(self):
+        self.name = _text(self.name, "Unknown Event")
+        self.venue = _text(self.venue, "Unknown Venue")
+        self.lat, self.lng = _number(self.lat), _number(self.lng)
+
+
+@dataclass(slots=True)
+class Attraction(Record):
+    name: str
+    lat: float
+    lng: float
+    rating: float = 0.0
+    reviews: int = 0
+    category: str = ""
+    image: Optional[str] = None
+    maps_url: Optional[str] = None
+    address: Optional[str] = None
+
+    def __post_init__(self):
+        self.name = _text(self.name, "Unnamed")
+        self.lat, self.lng = float(self.lat), float(self.lng)
+        self.rating, self.reviews = float(self.rating or 0), int(self.reviews or 0)
+
+
+RECORD_TYPES = {cls.__name__: cls for cls in (Flight, Hotel, Event, Attraction)}
+
+
+def _tagged(record: Record) -> dict:
+    return {"_type": type(record).__name__, **record.to_dict()}
+
+
+def _default(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _default_tagged(value):
+    if isinstance(value, Record):
+        return _tagged(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value) -> bytes:
+    """JSON for API responses: records become plain objects under their API keys."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def dumps_tagged(value) -> bytes:
+    """JSON for caches: records carry a `_type` tag so `loads_tagged` can rebuild them."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default_tagged, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(value, default=_default_tagged, separators=(",", ":")).encode()
+
+
+def _revive(value):
+    if isinstance(value, list):
+        return [_revive(v) for v in value]
+    if isinstance(value, dict):
+        cls = RECORD_TYPES.get(value.get("_type"))
+        if cls is not None:
+            return cls.from_dict(value)
+        return {k: _revive(v) for k, v in value.items()}
+    return value
+
+
+def loads_tagged(raw):
+    return _revive(orjson.loads(raw) if orjson is not None else json.loads(raw))
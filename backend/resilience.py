@@ -0,0 +1,364 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import config
+
+# Consecutive failures (errors, 429s, 5xx, timeouts) that open a provider's breaker
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+# Seconds an open breaker skips the provider before letting a probe through
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+# Requests per second per provider, e.g. "ticketmaster=5,amadeus=10"; empty disables limiting
+RATE_LIMITS = os.getenv("UPSTREAM_RATE_LIMITS", "ticketmaster=5,amadeus=10,google=50")
+# Longest a call waits for a rate-limit token before giving up
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2"))
+# Redis shared by all workers for breaker and bucket state; defaults to the result cache
+STATE_URL = os.getenv("UPSTREAM_STATE_URL", os.getenv("RESULT_CACHE_URL", ""))
+# How often a worker looks for breakers opened by other workers
+SYNC_INTERVAL = 1.0
+# Seconds to stop using that Redis after a failed call; meanwhile each worker keeps its own state
+STATE_RETRY = float(os.getenv("UPSTREAM_STATE_RETRY", "10"))
+
+# A 429 halves the allowed rate, never below this share of the configured rate
+MIN_RATE_FRACTION = 0.1
+# Each success wins back this share of the configured rate
+RECOVERY_FRACTION = 0.05
+
+PREFIX = "travel-agent:upstream:"
+
+# Refill and take one token atomically; returns 0 or the seconds until a token is free
+TOKEN_BUCKET_LUA = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+
+class UpstreamUnavailable(Exception):
+    """A provider was skipped: its breaker is open or no rate-limit token came in time."""
+
+
+class SharedStore:
+    """
+    Redis client for state shared between workers. A failed call puts it aside for
+    `STATE_RETRY` seconds, so an outage costs one timeout per window, not one per call.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.failing = False
+        self.retry_at = 0.0
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def run(self, call, default=None):
+        """`call(client)`, or `default` while Redis is put aside or when the call fails."""
+        if not self.available():
+            return default
+        try:
+            result = call(self.client)
+        except Exception as e:
+            # Log once per outage; calls already in flight fail too
+            if not self.failing:
+                print("⚠️ Shared upstream state unreachable, each worker uses its own:", str(e))
+            self.failing = True
+            self.retry_at = time.monotonic() + STATE_RETRY
+            return default
+        self.failing = False
+        return result
+
+
+def _redis(url: str):
+    if not url:
+        return None
+    import redis  # optional dependency, only needed when a shared state URL is set
+
+    return SharedStore(redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2))
+
+
+# Breaker publishing and syncing happen here, never on the caller's thread or event loop
+_store_pool = ThreadPoolExecutor(max_workers=1)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open for `cooldown` seconds -> half open,
+    where a single probe decides between closed and open again.
+
+    With a Redis `store`, opening is published so every worker skips the provider.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN, store=None):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.store = store
+        self.failures = 0
+        self.trips = 0
+        self.opened_until = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._synced = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if not self.opened_until:
+            return "closed"
+        return "open" if time.time() < self.opened_until else "half_open"
+
+    def is_open(self) -> bool:
+        self._sync()
+        return self.state == "open"
+
+    def admit(self) -> Optional[str]:
+        """None when the call must be skipped, else "pass" or, for the single half-open call, "probe"."""
+        self._sync()
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "pass"
+            if state == "open":
+                return None
+            # A probe that never reported (e.g. lost to a crash) stops blocking after `cooldown`
+            if self._probing and time.time() - self._probe_started < self.cooldown:
+                return None
+            self._probing = True
+            self._probe_started = time.time()
+            return "probe"
+
+    def release(self):
+        """Free the probe slot of a call that ended without an outcome: cancelled or never sent."""
+        with self._lock:
+            self._probing = False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            state = self.state
+            # Calls already in flight when the breaker opened don't extend it
+            if state == "open" or (state == "closed" and self.failures < self.threshold):
+                return
+            self.opened_until = time.time() + self.cooldown
+            self._probing = False
+            self.trips += 1
+        print(f"🚧 {self.name} breaker open for {self.cooldown:g}s after {self.failures} failures")
+        if self.store is not None:
+            opened_until = self.opened_until
+            _store_pool.submit(self.store.run, lambda client: client.set(
+                PREFIX + f"breaker:{self.name}", opened_until, ex=max(int(self.cooldown), 1)))
+
+    def _sync(self):
+        """Start fetching breakers opened by other workers; seen by the calls after this one."""
+        now = time.time()
+        if self.store is None or not self.store.available() or now - self._synced < SYNC_INTERVAL:
+            return
+        self._synced = now
+        _store_pool.submit(self._pull)
+
+    def _pull(self):
+        raw = self.store.run(lambda client: client.get(PREFIX + f"breaker:{self.name}"))
+        if raw is not None:
+            with self._lock:
+                self.opened_until = max(self.opened_until, float(raw))
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` per second, up to `burst` tokens.
+
+    The rate adapts AIMD-style: `throttle` (on a 429) halves it and each `recover`
+    (on a success) wins back a little. With a Redis `store` the bucket is shared
+    by every worker; if Redis is unreachable each worker limits itself.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float = None, store=None):
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.store = store
+        self.tokens = self.burst
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._script = store.client.register_script(TOKEN_BUCKET_LUA) if store is not None else None
+
+    def shared(self) -> bool:
+        """Whether `try_acquire` goes to Redis (and so should stay off the event loop)."""
+        return self.store is not None and self.store.available()
+
+    def try_acquire(self) -> float:
+        """Take a token; returns 0, or the seconds to wait before trying again."""
+        if self.shared():
+            wait = self.store.run(lambda client: float(self._script(
+                keys=[PREFIX + f"bucket:{self.name}"], args=[self.rate, self.burst, time.time()])))
+            if wait is not None:
+                return wait
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def throttle(self):
+        with self._lock:
+            self.rate = max(self.rate / 2, self.max_rate * MIN_RATE_FRACTION)
+            self.throttled += 1
+
+    def recover(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.rate + self.max_rate * RECOVERY_FRACTION, self.max_rate)
+
+    def stats(self) -> dict:
+        return {"rate": round(self.rate, 3), "max_rate": self.max_rate, "throttled": self.throttled}
+
+
+def parse_rate_limits(spec: str) -> dict:
+    """Parse e.g. "ticketmaster=5,amadeus=10" into {provider: requests per second}."""
+    limits = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            limits[name.strip()] = float(rate)
+    return limits
+
+
+_store = _redis(STATE_URL)
+_rate_limits = parse_rate_limits(RATE_LIMITS)
+_breakers = {}
+_buckets = {}
+_registry_lock = threading.Lock()
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    found = _breakers.get(upstream)
+    if found is None:
+        with _registry_lock:
+            found = _breakers.setdefault(upstream, CircuitBreaker(upstream, store=_store))
+    return found
+
+
+def bucket(upstream: str):
+    """The provider's rate limiter, or None when it is not limited."""
+    if upstream not in _rate_limits:
+        return None
+    found = _buckets.get(upstream)
+    if found is None:
+        with _registry_lock:
+            found = _buckets.setdefault(upstream, TokenBucket(upstream, _rate_limits[upstream], store=_store))
+    return found
+
+
+def _unavailable(upstream: str) -> UpstreamUnavailable:
+    return UpstreamUnavailable(f"{upstream} is failing; skipped while its circuit breaker is open")
+
+
+def reject_if_open(upstream: str):
+    """Fail fast before waiting for a rate-limit token; doesn't take the half-open probe slot."""
+    if breaker(upstream).is_open():
+        raise _unavailable(upstream)
+
+
+def check(upstream: str) -> bool:
+    """
+    Admit one call to `upstream`; True when it is the half-open probe, which must end
+    in `report` or `release`. Raises while the breaker is open or another probe is out.
+    """
+    admitted = breaker(upstream).admit()
+    if admitted is None:
+        raise _unavailable(upstream)
+    return admitted == "probe"
+
+
+def release(upstream: str):
+    breaker(upstream).release()
+
+
+def token_wait(upstream: str, waited: float, limit: float) -> float:
+    """
+    Seconds to sleep before calling `upstream` again; 0 means a token was taken.
+    Raises once the total wait would pass `limit` (the max wait or the request deadline).
+    """
+    limiter = bucket(upstream)
+    if limiter is None:
+        return 0.0
+    return _within(upstream, limiter.try_acquire(), waited, limit)
+
+
+async def atoken_wait(upstream: str, waited: float, limit: float) -> float:
+    """Async variant of `token_wait`; a shared bucket is asked from a worker thread."""
+    limiter = bucket(upstream)
+    if limiter is None:
+        return 0.0
+    wait = await asyncio.to_thread(limiter.try_acquire) if limiter.shared() else limiter.try_acquire()
+    return _within(upstream, wait, waited, limit)
+
+
+def _within(upstream: str, wait: float, waited: float, limit: float) -> float:
+    if wait and waited + wait > limit:
+        raise UpstreamUnavailable(f"{upstream} rate limit: no request slot within {limit:.1f}s")
+    return wait
+
+
+def report(upstream: str, status: int = None):
+    """Feed one attempt's outcome (None for a connection error or timeout) to the provider's breaker and limiter."""
+    limiter = bucket(upstream)
+    if status is None or status == 429 or status >= 500:
+        breaker(upstream).failure()
+        if status == 429 and limiter is not None:
+            limiter.throttle()
+    else:
+        breaker(upstream).success()
+        if limiter is not None:
+            limiter.recover()
+
+
+def claim(name: str, seconds: float) -> bool:
+    """
+    Take a lease shared by every worker for `seconds`; False while another worker holds it.
+    Without a shared store (or when it is unreachable) every worker gets it.
+    """
+    if _store is None:
+        return True
+    return _store.run(lambda client: bool(client.set(PREFIX + name, 1, nx=True, ex=max(int(seconds), 1))), True)
+
+
+def stats() -> dict:
+    """Breaker state and current rate limit per provider seen by this worker."""
+    names = sorted(set(_breakers) | set(_buckets))
+    return {
+        name: {
+            **breaker(name).stats(),
+            **(bucket(name).stats() if bucket(name) is not None else {}),
+        }
+        for name in names
+    }
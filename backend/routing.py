@@ -0,0 +1,121 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+# Rebalancing rounds when grouping places into days; a handful of points settles in two or three
+CLUSTER_ROUNDS = 8
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; broadcasts over NumPy arrays."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(points) -> np.ndarray:
+    """Pairwise km between (lat, lng) points."""
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    return haversine(p[:, None, 0], p[:, None, 1], p[None, :, 0], p[None, :, 1])
+
+
+def cluster(points, k: int, capacity: int) -> list:
+    """
+    Group (lat, lng) points into at most `k` clusters of at most `capacity` points.
+
+    Centers start from the first point (callers pass them best first) and then the
+    farthest remaining ones; each round assigns the closest point/center pairs first,
+    skipping full clusters, and moves every center to the mean of its points.
+    Returns a cluster index per point.
+    """
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    n = len(p)
+    k = min(k, n)
+    if k == 0:
+        return []
+    capacity = max(capacity, -(-n // k))
+
+    seeds = [0]
+    nearest = haversine(p[:, 0], p[:, 1], p[0, 0], p[0, 1])
+    while len(seeds) < k:
+        seeds.append(int(np.argmax(nearest)))
+        nearest = np.minimum(nearest, haversine(p[:, 0], p[:, 1], p[seeds[-1], 0], p[seeds[-1], 1]))
+    centers = p[seeds]
+
+    labels = np.full(n, -1)
+    for _ in range(CLUSTER_ROUNDS):
+        dist = haversine(p[:, None, 0], p[:, None, 1], centers[None, :, 0], centers[None, :, 1])
+        assigned, sizes = np.full(n, -1), np.zeros(k, dtype=int)
+        for flat in np.argsort(dist, axis=None):
+            point, center = divmod(int(flat), k)
+            if assigned[point] < 0 and sizes[center] < capacity:
+                assigned[point] = center
+                sizes[center] += 1
+        if np.array_equal(assigned, labels):
+            break
+        labels = assigned
+        centers = np.array([p[labels == c].mean(axis=0) if sizes[c] else centers[c] for c in range(k)])
+    return labels.tolist()
+
+
+def path_length(dist: np.ndarray, order: list) -> float:
+    return float(dist[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+
+def nearest_neighbor(dist: np.ndarray, start: int, nodes: list) -> list:
+    """Greedy path from `start` through `nodes`, always to the closest unvisited one."""
+    order, left = [start], [n for n in nodes if n != start]
+    while left:
+        step = left[int(np.argmin(dist[order[-1], left]))]
+        order.append(step)
+        left.remove(step)
+    return order
+
+
+def two_opt(dist: np.ndarray, order: list, fixed_start: bool = False, fixed_end: bool = False) -> list:
+    """
+    Improve an open path by reversing segments while that shortens it.
+    A fixed start or end stays in place; an open end costs nothing to move.
+    """
+    order = list(order)
+    n = len(order)
+    first, last = int(fixed_start), n - 1 - int(fixed_end)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(first, last):
+            for j in range(i + 1, last + 1):
+                before = dist[order[i - 1], order[i]] if i > 0 else 0.0
+                after = dist[order[j], order[j + 1]] if j + 1 < n else 0.0
+                swapped = (dist[order[i - 1], order[j]] if i > 0 else 0.0) + (dist[order[i], order[j + 1]] if j + 1 < n else 0.0)
+                if swapped < before + after - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+
+def route(points, start=None, end=None) -> tuple:
+    """
+    Short visiting order through `points`, optionally leaving from `start` and
+    finishing at `end` (both (lat, lng)): nearest neighbor, then 2-opt.
+
+    Returns (indices into `points` in visiting order, total km including the start and end legs).
+    """
+    stops = list(points)
+    if not stops:
+        return [], 0.0
+    nodes = [tuple(s) for s in stops] + [tuple(x) for x in (start, end) if x is not None]
+    dist = distance_matrix(nodes)
+    inner = list(range(len(stops)))
+    start_at = len(stops) if start is not None else None
+    end_at = len(nodes) - 1 if end is not None else None
+
+    if start_at is not None:
+        candidates = [nearest_neighbor(dist, start_at, inner)]
+    else:
+        # No fixed start: keep the best greedy path over every starting stop
+        candidates = [nearest_neighbor(dist, s, inner) for s in inner]
+    if end_at is not None:
+        candidates = [order + [end_at] for order in candidates]
+    order = min(candidates, key=lambda o: path_length(dist, o))
+    order = two_opt(dist, order, fixed_start=start_at is not None, fixed_end=end_at is not None)
+    return [i for i in order if i < len(stops)], round(path_length(dist, order), 2)
@@ -0,0 +1,207 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from opentelemetry import trace  # optional; spans are exported when an OTel SDK is configured
+    _tracer = trace.get_tracer("travel-agent")
+except ImportError:
+    _tracer = None
+
+# Seconds; covers cache hits through slow LLM completions
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Spans finished in the current request, when a trace was started for it
+_current_trace = ContextVar("trace", default=None)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by one label."""
+
+    def __init__(self, name: str, help: str, label: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._counts = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float):
+        with self._lock:
+            self._counts[label_value][bisect_left(self.buckets, seconds)] += 1
+            self._sums[label_value] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, counts in sorted(self._counts.items()):
+                label = f'{self.label}="{_escape(value)}"'
+                total = 0
+                for bound, count in zip(self.buckets, counts):
+                    total += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {total}')
+                total += counts[-1]
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {total}')
+                lines.append(f"{self.name}_sum{{{label}}} {self._sums[value]:.6f}")
+                lines.append(f"{self.name}_count{{{label}}} {total}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, amount in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_labels(self.labels, values)}}} {amount:g}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+stage_seconds = Histogram("travel_stage_duration_seconds", "Time spent in each pipeline stage.", "stage")
+upstream_seconds = Histogram("travel_upstream_request_duration_seconds", "Outbound HTTP request latency per upstream.", "upstream")
+llm_tokens = Counter("travel_llm_tokens_total", "LLM tokens used, per model and kind.", ("model", "kind"))
+stage_errors = Counter("travel_stage_errors_total", "Pipeline stages that raised, per stage.", ("stage",))
+cache_warms = Counter("travel_cache_warm_total", "Cache entries refreshed by the warmer, per kind and outcome.", ("kind", "outcome"))
+agent_step_tokens = Histogram("travel_agent_step_tokens", "LLM tokens spent per CodeAgent step.", "kind",
+                              buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+
+
+@contextmanager
+def span(name: str, histogram: Histogram = stage_seconds, label: str = None, **attributes):
+    """
+    Time a block as a named span.
+
+    The duration lands in `histogram` under `label` (default: the span name), in the
+    current request's trace if one was started, and in OpenTelemetry when installed.
+    """
+    otel = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else None
+    if otel is not None:
+        otel.__enter__()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        stage_errors.inc(name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(label or name, elapsed)
+        spans = _current_trace.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+        if otel is not None:
+            otel.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+
+
+def traced(name: str):
+    """Decorator form of `span` for plain and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_trace() -> list:
+    """Collect the spans of the current request; returns the (name, seconds) list that fills up."""
+    spans = []
+    _current_trace.set(spans)
+    return spans
+
+
+def format_trace(spans: list) -> str:
+    """One-line breakdown, e.g. "extract_metadata 2ms · http.google 3× 410ms"; repeated spans are summed."""
+    totals = {}
+    for name, seconds in spans:
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + seconds)
+    return " · ".join(f"{name} {f'{count}× ' if count > 1 else ''}{total * 1000:.0f}ms"
+                      for name, (count, total) in totals.items())
+
+
+def record_tokens(model: str, usage: dict):
+    if not usage:
+        return
+    llm_tokens.inc(model, "prompt", amount=usage.get("prompt_tokens", 0))
+    llm_tokens.inc(model, "completion", amount=usage.get("completion_tokens", 0))
+
+
+def _series(name: str, help: str, kind: str, labels: tuple, samples: list) -> list:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{{{_labels(labels, values)}}} {value:g}" for values, value in samples]
+    return lines
+
+
+# Gauge values for circuit breaker states
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def render(http_stats: dict, cache_stats: dict, llm_cache_stats: dict = None, upstream_guards: dict = None) -> str:
+    """Prometheus text exposition of every metric in this process."""
+    lines = stage_seconds.render() + upstream_seconds.render() + stage_errors.render() + llm_tokens.render()
+    lines += cache_warms.render()
+    lines += agent_step_tokens.render()
+
+    # http_client already counts requests, retries, errors, timeouts and status codes
+    upstream_events = [((upstream, key), value)
+                       for upstream, counters in sorted(http_stats.items())
+                       for key, value in sorted(counters.items()) if key != "elapsed_ms"]
+    lines += _series("travel_upstream_events_total", "Outbound HTTP requests, retries, errors and status codes per upstream.",
+                     "counter", ("upstream", "event"), upstream_events)
+
+    for key, kind, help in (("hits", "counter", "Cache hits"), ("misses", "counter", "Cache misses"),
+                            ("hit_rate", "gauge", "Cache hit ratio")):
+        samples = [((cache,), stats.get(key, 0)) for cache, stats in sorted(cache_stats.items())]
+        name = "travel_cache_hit_ratio" if key == "hit_rate" else f"travel_cache_{key}_total"
+        lines += _series(name, f"{help} per cache.", kind, ("cache",), samples)
+
+    if llm_cache_stats:
+        saved = [((key[len("saved_"):],), value) for key, value in sorted(llm_cache_stats.items()) if key.startswith("saved_")]
+        lines += _series("travel_llm_cache_saved_total", "Tokens and USD saved by the LLM response cache.", "counter", ("kind",), saved)
+
+    if upstream_guards:
+        guards = sorted(upstream_guards.items())
+        lines += _series("travel_circuit_breaker_state", "Circuit breaker state per upstream (0 closed, 1 half open, 2 open).",
+                         "gauge", ("upstream",), [((name,), BREAKER_STATES[g["state"]]) for name, g in guards])
+        lines += _series("travel_circuit_breaker_trips_total", "Times each upstream's circuit breaker opened.",
+                         "counter", ("upstream",), [((name,), g["trips"]) for name, g in guards])
+        lines += _series("travel_rate_limit_rps", "Current adaptive request rate allowed per upstream.",
+                         "gauge", ("upstream",), [((name,), g["rate"]) for name, g in guards if "rate" in g])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,43 @@
+"""
+The CodeAgent fallback. Imported on first use (main preloads it after startup):
+smolagents takes longer to import than the rest of the app, and the fast plan
+never needs it.
+"""
+from smolagents import CodeAgent, tool
+from smolagents.utils import AgentError
+
+import AttractionSearchTool as ats
+import EventSearchTool as es
+import FlightSearchTool as fs
+import HotelSearchTool as hs
+import telemetry
+from agent_budget import AGENT_MAX_STEPS, StepBudget, prompt_templates
+
+# The tool modules export plain functions; they become smolagents tools here
+TOOLS = [
+    tool(fn) for fn in (
+        es.search_ticketmaster_events,
+        ats.get_popular_attractions,
+        fs.search_flight_amadeus,
+        fs.search_flexible_flights,
+        hs.search_hotels_from_city,
+    )
+]
+PROMPT_TEMPLATES = prompt_templates()
+
+
+def build_agent(model, budget: StepBudget) -> CodeAgent:
+    # CodeAgent keeps per-run memory, so concurrent requests each get their own
+    return CodeAgent(
+        tools=TOOLS,
+        model=model,
+        add_base_tools=False,
+        prompt_templates=PROMPT_TEMPLATES,
+        max_steps=AGENT_MAX_STEPS,
+        step_callbacks=[record_step, budget]
+    )
+
+
+def record_step(step):
+    if step.duration is not None:
+        telemetry.stage_seconds.observe("agent_step", step.duration)
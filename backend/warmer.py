@@ -0,0 +1,95 @@
+import asyncio
+import os
+import random
+import time
+
+import airports
+import config
+import AttractionSearchTool as ats
+import HotelSearchTool as hs
+import cache
+import resilience
+import telemetry
+from amadeus_auth import aget_amadeus_token
+from cache import geocode_cache, result_cache, normalize_key
+
+# Hot destinations kept warm in the cache, e.g. "New York,Chicago,Miami"; empty disables the warmer
+WARM_CITIES = [c.strip() for c in os.getenv("WARM_CITIES", "").split(",") if c.strip()]
+# Seconds between warming rounds; half the attractions/hotel ID TTL so entries never lapse
+WARM_INTERVAL = float(os.getenv("WARM_INTERVAL", str(cache.TOOL_TTLS["attractions"] / 2)))
+# Pause between cities, keeping background traffic a trickle next to user requests
+WARM_PAUSE = float(os.getenv("WARM_PAUSE", "1"))
+
+
+def _claim(city: str) -> bool:
+    """
+    With results shared in Redis, only one worker per round warms a city; without
+    it every worker has its own cache and warms it itself.
+    """
+    if not cache.RESULT_CACHE_URL:
+        return True
+    return resilience.claim(f"warm:{normalize_key(city)}", WARM_INTERVAL - 60)
+
+
+def _available(upstream: str) -> bool:
+    # Background refreshes never probe a failing provider; user traffic does that
+    return resilience.breaker(upstream).state == "closed"
+
+
+async def _warm(kind: str, upstream: str, refresh):
+    if not _available(upstream):
+        telemetry.cache_warms.inc(kind, "skipped")
+        return
+    try:
+        with telemetry.span(f"warm.{kind}"):
+            value = await refresh()
+        telemetry.cache_warms.inc(kind, "ok" if result_cache.cacheable(value) else "empty")
+    except Exception as e:
+        telemetry.cache_warms.inc(kind, "error")
+        print(f"⚠️ Could not warm {kind}:", str(e))
+
+
+async def warm_city(city: str):
+    """Geocode, attractions and hotel IDs for one city, through the normal rate limits."""
+    if geocode_cache.get(ats.city_key(city)) is None:
+        await _warm("geocode", "google", lambda: ats.aget_coordinates(city))
+    await _warm("attractions", "google", lambda: result_cache.arefresh(
+        "attractions", ats.city_key(city), lambda: ats.aquery_attractions(city)))
+
+    code = airports.city_code(city)
+    if code is None:
+        telemetry.cache_warms.inc("hotel_ids", "skipped")
+        return
+
+    async def hotel_ids():
+        token = await aget_amadeus_token()
+        return await result_cache.arefresh("hotel_ids", normalize_key(code, 5), lambda: hs.afetch_hotel_ids(code, token))
+
+    await _warm("hotel_ids", "amadeus", hotel_ids)
+
+
+async def warm_once(cities: list = None):
+    started = time.perf_counter()
+    warmed = 0
+    # "NYC" and "New York City" are one city, warmed once under the keys user requests look up
+    for city in dict.fromkeys(airports.canonical_city(c) for c in cities or WARM_CITIES):
+        # The lease lives in Redis; keep that round trip off the event loop
+        if not await asyncio.to_thread(_claim, city):
+            continue
+        await warm_city(city)
+        warmed += 1
+        await asyncio.sleep(WARM_PAUSE)
+    print(f"🔥 Warmed {warmed} cities in {time.perf_counter() - started:.1f}s")
+
+
+async def run():
+    """Background loop started by the app: one warming round every `WARM_INTERVAL` seconds."""
+    # Spread workers that start together so their first rounds don't coincide
+    await asyncio.sleep(random.uniform(0, WARM_PAUSE * 5))
+    while True:
+        started = time.monotonic()
+        try:
+            await warm_once()
+        except Exception as e:
+            print("🔥 Warming round failed:", str(e))
+        await asyncio.sleep(max(WARM_INTERVAL - (time.monotonic() - started), WARM_PAUSE))
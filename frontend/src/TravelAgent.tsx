@@ -6,19 +6,49 @@ export default function TravelAgent() {
     const [result, setResult] = useState<any>(null);
 
 
+    // Apply one server-sent event from /api/agent/stream to the rendered plan
+    const handleEvent = (frame: string) => {
+        let event = "message";
+        let data = "";
+        for (const line of frame.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+        }
+        if (!data) return;
+
+        const payload = JSON.parse(data);
+        console.log("Backend event:", event, payload); // 👈 LOG
+        if (event === "summary") {
+            setResult((prev: any) => ({ ...prev, summary: (prev?.summary ?? "") + payload.delta }));
+        } else if (event === "error") {
+            setResult((prev: any) => ({ ...prev, error: payload.error }));
+        } else if (["events", "flights", "hotels", "attractions"].includes(event)) {
+            setResult((prev: any) => ({ ...prev, [event]: payload }));
+        }
+    };
+
     const fetchPlan = async () => {
+        setResult({});
         try {
-            const res = await fetch("http://localhost:8000/api/agent", {
+            const res = await fetch("http://localhost:8000/api/agent/stream", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ prompt }),
             });
-            const data = await res.json();
-            console.log("Backend response:", data); // 👈 LOG
-            setResult({
-                summary: data.result,
-                ...data.structured,
-            });
+            if (!res.body) throw new Error("Streaming not supported");
+
+            // Sections render as soon as their tool finishes; the summary streams in last
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const frames = buffer.split("\n\n");
+                buffer = frames.pop() ?? "";
+                frames.forEach(handleEvent);
+            }
         } catch (err) {
             console.error("Fetch or parse error:", err);
             setResult({ error: "Failed to get plan." });